@@ -0,0 +1,188 @@
+# coding=utf-8
+"""Rough performance measurements for fcc. Run `python bench.py` to execute
+every benchmark, or `python bench.py <name> ...` to pick some of them."""
+from __future__ import absolute_import, unicode_literals, division
+
+import fcc
+
+from collections import Counter
+from StringIO import StringIO
+from time import time
+import sys
+
+
+def build(path):
+    return fcc.compile(fcc.parse(fcc.lex(open(path).read())))
+
+
+def quiet(function, *args, **kwargs):
+    """Calls `function` with stdout redirected and returns the elapsed time in
+    seconds."""
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        start = time()
+        function(*args, **kwargs)
+        return time() - start
+    finally:
+        sys.stdout = stdout
+
+
+class CountingStack(bytearray):
+    """A stack that counts the temporary buffers created by slicing it."""
+    slices = 0
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            CountingStack.slices += 1
+        return bytearray.__getitem__(self, key)
+
+
+def allocations(path="tests/fib.c"):
+    """Counts the temporary objects created by the reference virtual machine
+    when accessing its stack, per executed instruction: bytes objects (packed
+    values and stack slices) and tuples (unpacked values)."""
+    vm = fcc.FullCircleVirtualMachine(build(path))
+    calls = Counter()
+
+    def profile(frame, event, function):
+        if event == "c_call":
+            calls[function.__name__] += 1
+
+    vm.start(65536)
+    vm.stack = CountingStack(vm.stack)
+    vm.views = fcc.vm.views(vm.stack)
+    CountingStack.slices = steps = 0
+    stdout, sys.stdout = sys.stdout, StringIO()
+    sys.setprofile(profile)
+    try:
+        while True:
+            vm.step()
+            steps += 1
+    except fcc.vm.ProgramTerminated:
+        pass
+    finally:
+        sys.setprofile(None)
+        sys.stdout = stdout
+        vm.stop()
+
+    buffers = CountingStack.slices + calls["pack"]
+    tuples = calls["unpack"] + calls["unpack_from"]
+    print "%s: %d instructions" % (path, steps)
+    print "  temporary bytes objects per instruction: %.2f" % (buffers / steps)
+    print "  temporary tuples per instruction: %.2f" % (tuples / steps)
+
+
+def engines(path="tests/ack.c"):
+    """Measures the time it takes every engine to run `path`."""
+    bytecode = build(path)
+    for name in sorted(fcc.engines):
+        print "%s on %s: %.3fs" % (path, name,
+                                   quiet(fcc.run, bytecode, 1 << 20, name))
+
+
+def generate(size, everything=False):
+    """Returns a valid program of roughly `size` bytes. Its main function
+    only calls the first of the functions it defines, or all of them if
+    `everything` is set, in which case none of them are dropped."""
+    functions = []
+    template = """
+/* function number {0} */
+int f{0}(int a, int b) {{
+    int i = 0, total = 0x{0:x};
+    while (i < a) {{  // count up
+        total = total + i * b - (a >> 1);
+        if (total >= 1000 && b != 0) total = total % 1000;
+        i = i + 1;
+    }}
+    return total;
+}}
+"""
+    count = 0
+    while count < size:
+        functions.append(template.format(len(functions)))
+        count += len(functions[-1])
+    called = len(functions) if everything else 1
+    calls = "".join("    `f%d(10, 3);\n" % index for index in range(called))
+    return "".join(functions) + "void main() {\n" + calls + "}\n"
+
+
+def lexer(size=4 << 20):
+    """Measures the throughput of the lexer on a large generated program."""
+    source = generate(size)
+    start = time()
+    count = len(fcc.lex(source))
+    elapsed = time() - start
+    print "lexer: %d tokens in %.2fMB, %.2fMB/s" % (
+        count, len(source) / 2 ** 20, len(source) / 2 ** 20 / elapsed)
+
+
+def size_of(objects):
+    """Returns the total size of `objects` in bytes, counting every distinct
+    object only once."""
+    seen = set()
+    total = 0
+    for item in objects:
+        if id(item) not in seen:
+            seen.add(id(item))
+            total += sys.getsizeof(item)
+    return total
+
+
+def footprint(size=4 << 20):
+    """Measures the memory used per token by a lexed program, when it is
+    stored as a list of `Token` objects and as a `TokenStream`."""
+    source = generate(size)
+    objects = list(fcc.FullCircleLexer.iter_lex(StringIO(source)))
+    values = [getattr(token, "name", getattr(token, "value", None))
+              for token in objects]
+    listed = sys.getsizeof(objects) + size_of(objects) + size_of(values)
+
+    stream = fcc.lex(source)
+    arrays = [stream.kinds, stream.offsets, stream.values, stream.table,
+              stream.interned]
+    packed = size_of(arrays) + size_of(stream.table) + \
+        size_of(stream.interned) + size_of(key[1] for key in stream.interned)
+
+    count = len(stream)
+    print "footprint: %d tokens" % count
+    print "  token objects: %.1f bytes per token" % (listed / count)
+    print "  token stream: %.1f bytes per token" % (packed / count)
+
+
+def peephole(paths=("tests/ack.c", "tests/basic.c", "tests/fib.c",
+                     "tests/for.c", "tests/loop.c")):
+    """Counts the instructions of every program before and after the peephole
+    optimizer runs."""
+    total = [0, 0]
+    for path in paths:
+        root = fcc.parse(fcc.lex(open(path).read()))
+        root.validate()
+        fcc.fold(root)
+        code, _ = root.generate(0)
+        optimized = fcc.optimize(code, dict(root.functions))
+        total[0] += len(code)
+        total[1] += len(optimized)
+        print "%s: %d -> %d instructions" % (path, len(code), len(optimized))
+    print "peephole: %d -> %d instructions (%.1f%% fewer)" % (
+        total[0], total[1], 100 - 100 * total[1] / total[0])
+
+
+def analysis(size=1 << 20):
+    """Measures the time it takes to build the control flow graph of a large
+    generated program."""
+    bytecode = fcc.compile(fcc.parse(fcc.lex(generate(size, True))))
+    start = time()
+    graph = fcc.analysis.cfg(bytecode)
+    elapsed = time() - start
+    print "analysis: %d instructions, %d blocks, %d loops in %.2fs" % (
+        len(bytecode), len(graph), len(graph.loops), elapsed)
+
+
+benchmarks = [allocations, engines, lexer, footprint, peephole, analysis]
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or [benchmark.__name__ for benchmark in benchmarks]
+    for benchmark in benchmarks:
+        if benchmark.__name__ in names:
+            benchmark()
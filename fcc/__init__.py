@@ -1,9 +1,28 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
+from fcc import analysis
+from fcc.backends.python import FullCirclePythonGenerator
+from fcc.cache import CompileCache
 from fcc.lexer import FullCircleLexer
+from fcc.optimizer import fold, inline, inlining, optimize, revert
 from fcc.parser import FullCircleParser
 from fcc.vm import FullCircleVirtualMachine
+from fcc.vm.bytecode import Bytecode
+from fcc.vm.threaded import FullCircleThreadedVirtualMachine
+
+
+__version__ = "0.2.0"
+
+# revision of the code that `compile` generates, which `CompileCache` keys its
+# programs on; it must be increased whenever the instructions that a program
+# compiles to change, so that programs compiled before are compiled again
+CODE_REVISION = 1
+
+engines = {
+    "reference": FullCircleVirtualMachine,
+    "threaded": FullCircleThreadedVirtualMachine
+}
 
 
 def lex(data):
@@ -14,14 +33,72 @@ def parse(tokens):
     return FullCircleParser(tokens).parse()
 
 
-def compile(root):
-    root.validate()
-    return root.generate(0)[0]
+def compile(root, target="bytecode", inline_threshold=inlining.threshold):
+    """Compiles the syntax tree `root`. The default target returns virtual
+    machine `Bytecode`; the "python" target returns a python module whose
+    `run` function executes the program natively. Operations on constants
+    are evaluated at compile time. For bytecode, calls to functions of at
+    most `inline_threshold` nodes are inlined (0 disables inlining) and the
+    code is passed through `optimize` before it is linked; the result also
+    records the `stack_size` that the program runs with.
+
+    The changes that the optimizations make to `root` are reverted once it
+    is compiled, so it may be compiled again (for another target, say)."""
+    changes = []
+    try:
+        root.validate()
+        fold(root, changes)
+        if target == "python":
+            return FullCirclePythonGenerator(root).compile()
+        assert target == "bytecode", "Unknown target '%s'" % target
+        inline(root, inline_threshold, changes)
+        code = root.link(optimize(root.generate(0)[0], root.functions))
+        return Bytecode.from_tuples(code, root.addresses(),
+                                    stack_size(code, root.functions.values()))
+    finally:
+        revert(changes)
+
+
+def save(bytecode, path):
+    """Writes `bytecode` (as returned by `compile`) to the .fbc file at
+    `path`."""
+    if not isinstance(bytecode, Bytecode):
+        bytecode = Bytecode.from_tuples(bytecode)
+    bytecode.save(path)
+
+
+def load(path):
+    """Memory-maps a .fbc file written by `save` and returns its `Bytecode`,
+    which may be passed to `run` directly. The file stays mapped until the
+    program is closed, for instance by a `with` statement."""
+    return Bytecode.load(path)
+
+
+def stack_size(bytecode, functions=()):
+    """Returns the number of stack bytes that `run` gives `bytecode` by
+    default: exactly as many as `analysis.stack_usage` finds that it needs,
+    or 64 KiB if that is not known before it runs (such as when functions
+    recurse). `functions` are the addresses of its functions, which tell
+    tail calls apart from other jumps."""
+    size = analysis.stack_usage(bytecode, functions).size
+    return 65536 if size is None else size
 
 
-def run(bytecode, stack=65536):
-    FullCircleVirtualMachine(bytecode).run(stack)
+def run(bytecode, stack=None, engine="reference"):
+    """Executes `bytecode` on the virtual machine registered as `engine` in
+    `engines` and returns the final stack. Unless `stack` gives its size in
+    bytes, the stack is `stack_size` bytes large. That is worked out when the
+    program is compiled, and on its first run otherwise."""
+    if stack is None:
+        stack = getattr(bytecode, "stack", None)
+        if stack is None:
+            stack = stack_size(bytecode)
+            if isinstance(bytecode, Bytecode):
+                bytecode.stack = stack
+    return engines[engine](bytecode).run(stack)
 
 
 __all__ = ["FullCircleLexer", "FullCircleParser", "FullCircleVirtualMachine",
-           "lex", "parse", "compile", "run"]
+           "FullCircleThreadedVirtualMachine", "FullCirclePythonGenerator",
+           "Bytecode", "CompileCache", "engines", "lex", "parse", "compile",
+           "optimize", "save", "load", "stack_size", "run"]
@@ -0,0 +1,5 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.analysis.flow import *  # noqa
+from fcc.analysis.stack import *  # noqa
@@ -0,0 +1,304 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.optimizer.peephole import jumps, ends
+
+from bisect import bisect_right
+
+
+class BasicBlock(object):
+    """A run of instructions that execution only ever enters at the first one
+    and only ever leaves after the last one. Calls do not end a block, as
+    execution continues right after them once the callee returns."""
+    def __init__(self, index, start, instructions):
+        self.index = index
+        self.start = start
+        self.end = start + len(instructions)
+        self.instructions = instructions
+
+        self.successors = []
+        self.predecessors = []
+
+        # the immediate dominator, which is None for entry points and for the
+        # blocks that can not be reached
+        self.dominator = None
+
+        # the innermost loop that contains the block, if any
+        self.loop = None
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __repr__(self):
+        return "%s(%d:%d)" % (self.__class__.__name__, self.start, self.end)
+
+
+class Loop(object):
+    """A natural loop: `header` and the blocks that may run again after it
+    without going through it first. `latches` are the blocks that jump back
+    to the header. Loops with different headers are either disjoint or
+    nested, in which case `parent` is the innermost loop that contains this
+    one."""
+    def __init__(self, header):
+        self.header = header
+        self.latches = []
+        self.blocks = {header}
+        self.parent = None
+        self.depth = 1
+
+    def __repr__(self):
+        return "%s(%d:%d, %d blocks)" % (self.__class__.__name__,
+                                         self.header.start, self.header.end,
+                                         len(self.blocks))
+
+
+class ControlFlowGraph(object):
+    """The basic blocks of a linked program, the jumps between them, their
+    dominators and the loops they form.
+
+    `blocks` are ordered by address. The `entries` are the first block and
+    the first block of every function that is called; each of them is the
+    root of its own dominator tree. Calls and returns are not edges, so
+    every function is analyzed on its own. A `popip` jumps to an address
+    that is only known at run time and its block has no successors, like a
+    `ret`; jumps to the end of the program have none either.
+
+    Finding the blocks takes linear time in the number of instructions and
+    their dominators takes O(m log n) time for n blocks and m jumps between
+    them, plus the total size of the loops. Unless `loops` is set, only the
+    blocks and the jumps between them are found; dominators and loops are
+    left out then, and `dominates` may not be used."""
+    def __init__(self, code, loops=True):
+        self.code = list(code)
+        self.blocks = []
+        self.entries = []
+        self.back_edges = []
+        self.loops = []
+
+        self._split()
+        self._link()
+        if loops:
+            self._dominate()
+            self._nest()
+
+    def target(self, index):
+        """Returns the address that the jump at `index` leads to, with
+        relative offsets resolved, or None if it is not a jump."""
+        operation = self.code[index]
+        if operation[0] not in jumps:
+            return None
+        if jumps[operation[0]]:
+            return index + operation[1] + 1
+        return operation[1]
+
+    def block(self, address):
+        """Returns the block that contains the instruction at `address`."""
+        if not 0 <= address < len(self.code):
+            raise IndexError("No instruction at %d" % address)
+        return self.blocks[bisect_right(self._starts, address) - 1]
+
+    def dominates(self, first, second):
+        """Checks whether every path from an entry point to the block
+        `second` goes through the block `first`, which takes constant
+        time."""
+        if self._enter[first.index] is None or \
+                self._enter[second.index] is None:
+            return False
+        return self._enter[first.index] <= self._enter[second.index] and \
+            self._exit[second.index] <= self._exit[first.index]
+
+    def _split(self):
+        code = self.code
+        leaders = bytearray(len(code) + 1)
+        leaders[0] = 1
+        calls = set()
+        for index, operation in enumerate(code):
+            name = operation[0]
+            if name in jumps:
+                target = self.target(index)
+                if 0 <= target < len(code):
+                    leaders[target] = 1
+                if name == "call":
+                    calls.add(target)
+                    continue
+            if name in jumps or name in ends or name == "popip":
+                leaders[index + 1] = 1
+
+        starts = [index for index in xrange(len(code)) if leaders[index]]
+        for start, end in zip(starts, starts[1:] + [len(code)]):
+            self.blocks.append(BasicBlock(len(self.blocks), start,
+                                          code[start:end]))
+        self._starts = starts
+        self.entries = [self.block(address) for address in sorted(calls)
+                        if 0 < address < len(code)]
+        if code:
+            self.entries.insert(0, self.blocks[0])
+
+    def _link(self):
+        for block in self.blocks:
+            index = block.end - 1
+            name = self.code[index][0]
+            targets = []
+            if name not in ends and name != "popip":
+                targets.append(block.end)
+            if name in jumps and name != "call":
+                targets.append(self.target(index))
+
+            for target in targets:
+                if 0 <= target < len(self.code):
+                    successor = self.block(target)
+                    if successor not in block.successors:
+                        block.successors.append(successor)
+                        successor.predecessors.append(block)
+
+    def _dominate(self):
+        # Lengauer and Tarjan's algorithm with path compression, over block
+        # indices with an extra root that leads to every entry point. It
+        # takes O(m log n) time on a graph with n blocks and m edges.
+        count = len(self.blocks)
+        root = count
+        successors = [[successor.index for successor in block.successors]
+                      for block in self.blocks]
+        successors.append([entry.index for entry in self.entries])
+        predecessors = [[predecessor.index
+                         for predecessor in block.predecessors]
+                        for block in self.blocks]
+        for entry in self.entries:
+            predecessors[entry.index].append(root)
+
+        # depth first preorder, without recursion; blocks that are not
+        # reached keep a number of None
+        number = [None] * (count + 1)
+        parent = [None] * (count + 1)
+        order = [root]
+        number[root] = 0
+        pending = [(root, iter(successors[root]))]
+        while pending:
+            node, children = pending[-1]
+            for child in children:
+                if number[child] is None:
+                    number[child] = len(order)
+                    parent[child] = node
+                    order.append(child)
+                    pending.append((child, iter(successors[child])))
+                    break
+            else:
+                pending.pop()
+
+        # `semi` holds the preorder number of the semidominator of a block
+        # once it has been processed. `ancestor` and `label` make up the
+        # forest of processed blocks: `label` is the block with the smallest
+        # semidominator on the compressed path to the block.
+        semi = number[:]
+        ancestor = [None] * (count + 1)
+        label = range(count + 1)
+        dominator = [None] * (count + 1)
+        bucket = [[] for _ in xrange(count + 1)]
+
+        def evaluate(node):
+            if ancestor[node] is None:
+                return node
+            # compress the path, starting from the end that is closest to
+            # the root
+            path = []
+            other = node
+            while ancestor[ancestor[other]] is not None:
+                path.append(other)
+                other = ancestor[other]
+            for other in reversed(path):
+                if semi[label[ancestor[other]]] < semi[label[other]]:
+                    label[other] = label[ancestor[other]]
+                ancestor[other] = ancestor[ancestor[other]]
+            return label[node]
+
+        for node in reversed(order[1:]):
+            for other in predecessors[node]:
+                if number[other] is not None:
+                    semi[node] = min(semi[node], semi[evaluate(other)])
+            bucket[order[semi[node]]].append(node)
+            ancestor[node] = parent[node]
+
+            for other in bucket[parent[node]]:
+                result = evaluate(other)
+                dominator[other] = result if semi[result] < semi[other] \
+                    else parent[node]
+            del bucket[parent[node]][:]
+        for node in order[1:]:
+            if dominator[node] != order[semi[node]]:
+                dominator[node] = dominator[dominator[node]]
+
+        # number the dominator tree, so that dominance checks take constant
+        # time
+        children = [[] for _ in xrange(count + 1)]
+        for node in order[1:]:
+            children[dominator[node]].append(node)
+            if dominator[node] != root:
+                self.blocks[node].dominator = self.blocks[dominator[node]]
+        self._enter = [None] * (count + 1)
+        self._exit = [None] * (count + 1)
+        self._enter[root] = 0
+        clock = 1
+        pending = [(root, iter(children[root]))]
+        while pending:
+            node, nodes = pending[-1]
+            for child in nodes:
+                self._enter[child] = clock
+                clock += 1
+                pending.append((child, iter(children[child])))
+                break
+            else:
+                pending.pop()
+                self._exit[node] = clock
+                clock += 1
+
+        for node in order[1:]:
+            block = self.blocks[node]
+            for successor in block.successors:
+                if self.dominates(successor, block):
+                    self.back_edges.append((block, successor))
+
+    def _nest(self):
+        loops = {}
+        for latch, header in self.back_edges:
+            if header not in loops:
+                loops[header] = Loop(header)
+            loop = loops[header]
+            loop.latches.append(latch)
+
+            # every block that reaches the latch without going through the
+            # header belongs to the loop
+            pending = [latch]
+            while pending:
+                block = pending.pop()
+                if block in loop.blocks:
+                    continue
+                loop.blocks.add(block)
+                pending.extend(predecessor
+                               for predecessor in block.predecessors
+                               if self._enter[predecessor.index] is not None)
+        self.loops = sorted(loops.values(), key=lambda loop: loop.header.start)
+
+        # outer loops are larger than the loops they contain
+        for loop in sorted(self.loops, key=lambda loop: -len(loop.blocks)):
+            loop.parent = loop.header.loop
+            if loop.parent is not None:
+                loop.depth = loop.parent.depth + 1
+            for block in loop.blocks:
+                block.loop = loop
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __repr__(self):
+        return "%s(%d blocks, %d loops)" % (self.__class__.__name__,
+                                            len(self.blocks), len(self.loops))
+
+
+def cfg(bytecode):
+    """Returns the `ControlFlowGraph` of `bytecode`, as returned by
+    `fcc.compile`, or of a linked list of (`instruction`, `arg1`, ...)
+    tuples."""
+    return ControlFlowGraph(bytecode)
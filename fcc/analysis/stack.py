@@ -0,0 +1,191 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.analysis.flow import ControlFlowGraph
+from fcc.optimizer.peephole import adjustments
+from fcc.vm import formats
+from fcc.vm.threaded import binary, unary, branches
+
+# number of bytes that every instruction adds to the stack (or removes from
+# it, if negative); `alloc` and `release` move it by their operand instead,
+# while `call`, `ret` and `popip` are handled on their own
+effects = {
+    "nop": 0, "jmp": 0, "jmpr": 0,
+    "loadi": 4, "loadf": 4, "loadc": 1,
+    "pushi": 4, "pushf": 4, "pushc": 1, "puship": 4,
+    "popi": -4, "popf": -4, "popc": -1,
+    "jmp0": -1, "jmp0r": -1, "jmp1": -1, "jmp1r": -1
+}
+for _name, (_operand, _result, _) in binary.items():
+    effects[_name] = formats[_result].size - 2 * formats[_operand].size
+for _name, (_operand, _result, _) in unary.items():
+    effects[_name] = formats[_result].size - formats[_operand].size
+for _name, (_operand, _) in branches.items():
+    effects[_name] = -2 * formats[_operand].size
+
+# the return address that `call` pushes
+RETURN_ADDRESS = formats[int].size
+
+
+class StackUsage(object):
+    """The number of stack bytes that a linked program needs.
+
+    Functions are keyed by their address, with the code that runs before
+    `main` at 0. Every function's `frames` entry is the most that it
+    pushes above its return address, not counting its callees. Its `depths`
+    entry adds the callees it may run, and is the worst case of the whole
+    call; if calls may recurse, it is the worst case when none of them do
+    and `levels` is what every nested recursive call may add on top. Tail
+    calls reuse the caller's frame and so recursing through them is free.
+
+    A `jmp` is a tail call if it leads to one of the `functions`, which are
+    the addresses that functions start at; any other `jmp` stays within the
+    function. Functions that are called are always known, so `functions`
+    only has to list those that are reached by tail calls alone.
+
+    `bounded` is false if the program jumps to addresses that are only
+    known at run time (`popip`), or if the stack may grow every time a loop
+    runs; the figures only cover the rest of the code then."""
+    def __init__(self, code, functions=()):
+        self.graph = ControlFlowGraph(code, loops=False)
+        self.frames = {}
+        self.depths = {}
+        self.levels = {}
+        self.bounded = True
+
+        # the functions that every function calls, along with the number of
+        # bytes that it has pushed at the time (including the return address)
+        self.calls = {}
+
+        graph = self.graph
+        self.functions = set(functions)
+        self.functions.update(entry.start for entry in graph.entries[1:])
+        starts = set(entry.start for entry in graph.entries)
+        for index, operation in enumerate(graph.code):
+            if operation[0] == "jmp" and operation[1] in self.functions:
+                starts.add(operation[1])
+        for start in sorted(starts):
+            if 0 <= start < len(graph.code):
+                self._measure(start)
+        self._combine()
+
+    def _measure(self, start):
+        frame, calls = 0, []
+        heights = {}
+        pending = [(self.graph.block(start), 0)]
+        while pending:
+            block, height = pending.pop()
+            if block in heights:
+                if heights[block] != height:
+                    self.bounded = False
+                continue
+            heights[block] = height
+
+            tail = False
+            for index, operation in enumerate(block.instructions):
+                name = operation[0]
+                if name == "call":
+                    calls.append((self.graph.target(block.start + index),
+                                  height + RETURN_ADDRESS))
+                    height -= operation[2]
+                elif name == "jmp" and operation[1] in self.functions:
+                    # the callee returns straight to our caller
+                    calls.append((operation[1], height))
+                    tail = True
+                elif name in adjustments:
+                    height += operation[1] * adjustments[name]
+                elif name == "popip":
+                    self.bounded = False
+                elif name != "ret":
+                    height += effects[name]
+                frame = max(frame, height)
+
+            if not tail:
+                for successor in block.successors:
+                    pending.append((successor, height))
+
+        self.frames[start] = frame
+        self.calls[start] = [(callee, cost) for callee, cost in calls
+                             if 0 <= callee < len(self.graph.code)]
+
+    def _combine(self):
+        # callees come first, so that their depths are known
+        for component in components(self.calls):
+            members = set(component)
+            level, depth, nested = 0, 0, 0
+            for function in component:
+                depth = max(depth, self.frames[function])
+                for callee, cost in self.calls[function]:
+                    if callee in members:
+                        level = max(level, cost)
+                    else:
+                        depth = max(depth, cost + self.depths[callee])
+                        nested = max(nested, self.levels[callee])
+            for function in component:
+                self.depths[function] = depth
+                self.levels[function] = level + nested
+
+    @property
+    def size(self):
+        """The number of bytes that the program may need, or None if that is
+        not known before it runs."""
+        if not self.bounded or self.levels.get(0):
+            return None
+        return self.depths.get(0, 0)
+
+    def bound(self, recursion):
+        """Returns the number of bytes that the program may need when no more
+        than `recursion` recursive calls are nested, or None if that is not
+        known before it runs."""
+        if not self.bounded:
+            return None
+        return self.depths.get(0, 0) + recursion * self.levels.get(0, 0)
+
+    def __repr__(self):
+        return "%s(%s bytes, %d functions)" % (
+            self.__class__.__name__, self.size, len(self.frames))
+
+
+def components(calls):
+    """Returns the strongly connected components of the call graph `calls`,
+    which maps every function to (`callee`, `cost`) pairs, callees first.
+    Tarjan's algorithm, without recursion."""
+    result = []
+    index, lowlink, stack, active = {}, {}, [], set()
+    for function in sorted(calls):
+        if function in index:
+            continue
+        index[function] = lowlink[function] = len(index)
+        stack.append(function)
+        active.add(function)
+        pending = [(function, iter(calls[function]))]
+        while pending:
+            node, callees = pending[-1]
+            for callee, _ in callees:
+                if callee not in index:
+                    index[callee] = lowlink[callee] = len(index)
+                    stack.append(callee)
+                    active.add(callee)
+                    pending.append((callee, iter(calls[callee])))
+                    break
+                elif callee in active:
+                    lowlink[node] = min(lowlink[node], index[callee])
+            else:
+                pending.pop()
+                if pending:
+                    parent = pending[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while not component or component[-1] != node:
+                        component.append(stack.pop())
+                        active.discard(component[-1])
+                    result.append(component)
+    return result
+
+
+def stack_usage(bytecode, functions=()):
+    """Returns the `StackUsage` of `bytecode`, as returned by `fcc.compile`,
+    or of a linked list of (`instruction`, `arg1`, ...) tuples, whose
+    `functions` start at the given addresses."""
+    return StackUsage(bytecode, functions)
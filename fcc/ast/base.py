@@ -9,6 +9,9 @@ from __future__ import absolute_import, unicode_literals, division
 class Statement(object):
     """A statement is the smallest standalone element. A statement may contain
     0 or more sub statements that must be executed in order."""
+    # whether execution never continues after the statement
+    terminal = False
+
     def __init__(self, parent):
         self.parent = parent
         self.children = []
@@ -39,6 +42,11 @@ class Statement(object):
         statement. 'sp' is the stack pointer on block entry."""
         return [("nop", )], sp
 
+    def live_children(self):
+        """Returns the children that may be executed, leaving out the ones
+        that are known to never run. No code is generated for the others."""
+        return self.children
+
     def __repr__(self):
         if self.children:
             return "%s: %s" % (self.__class__.__name__, self.children)
@@ -95,7 +103,7 @@ class Block(Statement):
         self.sp = sp
 
         # execute all child statements
-        for child in self.children:
+        for child in self.live_children():
             code, sp = child.generate(sp)
             result.extend(code)
 
@@ -105,6 +113,13 @@ class Block(Statement):
 
         return result, self.sp
 
+    def live_children(self):
+        """Statements that follow a return statement never run."""
+        for index, child in enumerate(self.children):
+            if child.terminal:
+                return self.children[:index + 1]
+        return self.children
+
     def finalize(self, sp):
         """Called to revert stack position to the initial value upon entering
         the block. Must be called after `generate` and with the current stack
@@ -137,42 +152,80 @@ class GlobalBlock(Block):
                                       FunctionDefinition)), \
                 "Statements not allowed in global scope"
 
+    def reachable(self):
+        """Returns the set of functions that may be called (directly or not)
+        once 'main' starts."""
+        result = set()
+        pending = [self.symbols["main"]]
+        while pending:
+            function = pending.pop()
+            if function not in result:
+                result.add(function)
+                pending.extend(function.callees())
+        return result
+
     def generate(self, sp):
         result = []
         self.sp = sp
+        reachable = self.reachable()
 
-        for child in self.children:
-            # build child code
-            code, sp = child.generate(sp)
+        # the address of every function that is generated; the symbols are
+        # left alone, so that the tree may be compiled again
+        self.functions = {}
 
+        for child in self.children:
             if isinstance(child, self.func_type):
-                # do not explicitly execute functions except 'main'
+                if child not in reachable:
+                    # leave out functions that are never called
+                    continue
+
+                # function frames are addressed relative to their own start,
+                # regardless of the space taken by global variables
+                code, _ = child.generate(0)
+
+                # do not explicitly execute functions except 'main', which
+                # returns to the jump that skips it
                 if child.name == "main":
-                    result.append(("loadi", "__exit__"))
-                else:
-                    result.append(("jmpr", len(code)))
+                    result.append(("call", "main", 0))
+                result.append(("jmpr", len(code)))
 
                 # store function address and add bytecode
-                self.symbols[child.name] = len(result)
+                self.functions[child.name] = len(result)
+            else:
+                # build child code
+                code, sp = child.generate(sp)
 
             # append child code
             result.extend(code)
 
-        # 'main' will end up here, so pop the ip
-        result.append(("release", 4))
-        self.symbols["__exit__"] = len(result) - 1
-
         # clear stack
         code, sp = self.finalize(sp)
         result.extend(code)
 
-        # solve dangling references
+        return result, self.sp
+
+    def link(self, code):
+        """Returns a copy of `code` (as returned by `generate`) where every
+        reference to a function is replaced by its address in `functions`."""
+        result = list(code)
         for index, operation in enumerate(result):
-            if operation[0] in ("loadi", "jmp", "jmp0", "jmp1") and \
+            if operation[0] in ("loadi", "jmp", "jmp0", "jmp1", "call") and \
                     isinstance(operation[1], (str, unicode)):
                 try:
-                    result[index] = (operation[0], self.symbols[operation[1]])
+                    result[index] = (operation[0],
+                                     self.functions[operation[1]]) + \
+                        operation[2:]
                 except KeyError:
                     assert False, "Undefined reference '%s'" % operation[1]
-
-        return result, self.sp
+        return result
+
+    def addresses(self):
+        """Returns the address of every global symbol. Must be called after
+        `generate`: functions are mapped to the index of their first
+        instruction and variables to their stack address. Functions that are
+        left out of the code have no address."""
+        result = dict(self.functions)
+        for name, value in self.symbols.items():
+            if not isinstance(value, self.func_type):
+                result[name] = value.sp
+        return result
@@ -44,11 +44,38 @@ class FunctionDefinition(Block):
             sp -= self.return_type.size
             self.result.sp = sp
 
+    def generate(self, sp):
+        result, sp = super(FunctionDefinition, self).generate(sp)
+
+        # return to the caller when running past the end of the function
+        children = self.live_children()
+        if not children or not isinstance(children[-1], FunctionReturn):
+            result.append(("ret", ))
+        return result, sp
+
     def add_argument(self, name, expression_type):
         assert issubclass(expression_type, VariableDefinition)
         self.arguments.append(expression_type(name, self))
         self.children.pop()
 
+    def callees(self):
+        """Returns the set of functions that this function calls directly,
+        including the calls made by the bodies that were inlined into it."""
+        result = set()
+        pending = list(self.live_children())
+        while pending:
+            node = pending.pop()
+            if isinstance(node, FunctionCall):
+                result.add(node.definition)
+            elif isinstance(node, InlineFunctionCall):
+                pending.append(node.body)
+            pending.extend(node.live_children())
+        return result
+
+    def arguments_size(self):
+        """Returns the number of bytes taken by the function's arguments."""
+        return sum(arg.expression_type.size for arg in self.arguments)
+
     def assert_argument_list(self, arguments):
         for index, argument in enumerate(self.arguments):
             type_ = argument.expression_type
@@ -128,16 +155,9 @@ class FunctionCall(Statement):
         # determine total stack offset that needs to be cleaned up
         size = sp - osp - self.definition_type.return_type.size
 
-        # use the procedure's definition as address placeholder before linking
-        temp_addr = self.definition.name
-
-        result.extend([
-            ("loadi", 2),        # push 2
-            ("puship", ),        # push ip
-            ("addi", ),          # store ip + 2 as return address
-            ("jmp", temp_addr),  # unconditional jump to function address
-            ("release", size)    # rewind to initial stack size
-        ])
+        # use the procedure's name as address placeholder before linking; the
+        # arguments are released when the function returns
+        result.append(("call", self.definition.name, size))
         return result, osp + self.definition_type.return_type.size
 
 
@@ -154,6 +174,8 @@ class FloatFunctionCall(FunctionCall, FloatExpression):
 
 
 class FunctionReturn(Statement):
+    terminal = True
+
     def __init__(self, parent):
         super(FunctionReturn, self).__init__(parent)
 
@@ -176,11 +198,44 @@ class FunctionReturn(Statement):
             assert isinstance(self.children[0], self.definition.return_type), \
                 self.definition.return_type.name() + " expected"
 
+    def tail_call(self):
+        """Returns the function call whose result is returned, if the called
+        function can take over the frame of the current one. Frames can only
+        be reused if their arguments have the same size, since `ret` releases
+        the arguments of the original call."""
+        if not self.children or \
+                not isinstance(self.children[0], FunctionCall):
+            return None
+
+        call = self.children[0]
+        if call.definition.arguments_size() != \
+                self.definition.arguments_size():
+            return None
+        return call
+
     def generate(self, sp):
         # determine result
         osp = sp
         result = []
 
+        call = self.tail_call()
+        if call is not None:
+            # evaluate the new arguments and move them over the current ones
+            for child in call.children:
+                code, sp = child.generate(sp)
+                result.extend(code)
+            for argument in reversed(call.definition.arguments):
+                code, sp = argument.expression_type.pop(argument.addr(sp), sp)
+                result.extend(code)
+            assert sp == osp, "Code generation error"
+
+            # clear the stack and jump to the called function, which will
+            # store its result and return straight to our caller
+            code, sp = self.definition.finalize(osp)
+            result.extend(code)
+            result.append(("jmp", call.definition.name))
+            return result, osp
+
         # pop result to its address if not void
         if hasattr(self.definition, "result"):
             code, sp = self.children[0].generate(sp)
@@ -196,5 +251,109 @@ class FunctionReturn(Statement):
         # jump back to caller after clearing the stack
         code, sp = self.definition.finalize(osp)
         result.extend(code)
-        result.append(("popip", ))
+        result.append(("ret", ))
+        return result, osp
+
+
+class InlineFunctionCall(Statement):
+    """An inline function call executes its own copy of the body of a
+    function instead of calling it. The arguments are stored in the copy's
+    argument variables, which become locals of the caller, and the body is
+    followed by its continuation rather than by a `ret`: return statements
+    must be rewritten to `InlineReturn`s that jump to it."""
+    definition_type = FunctionDefinition
+
+    def __init__(self, definition, parent):
+        super(InlineFunctionCall, self).__init__(parent)
+
+        # the copy is not a child, so that it is neither validated nor
+        # optimized again along with the arguments
+        self.definition = definition
+        self.body = Block(None)
+        self.body.parent = self
+        self.body.symbols = definition.symbols
+        self.body.children = definition.children
+        for child in self.body.children:
+            child.parent = self.body
+        definition.children = []
+
+    def generate(self, sp):
+        osp = sp
+        return_type = self.definition_type.return_type
+
+        # allocate space for result if any
+        result, sp = return_type.alloc(sp)
+        if hasattr(self.definition, "result"):
+            self.definition.result.sp = osp
+        self.sp = sp
+
+        # bind the arguments to the copy's variables
+        for argument, child in zip(self.definition.arguments, self.children):
+            argument.sp = sp
+            code, sp = child.generate(sp)
+            result.extend(code)
+
+        code, sp = self.body.generate(sp)
+        result.extend(code)
+
+        # release arguments when running past the end of the body
+        if sp != self.sp:
+            result.append(("release", sp - self.sp))
+
+        # return statements continue right after the body; if the body ends
+        # with one, the code that follows its jump is unreachable
+        returns = [index for index, operation in enumerate(result)
+                   if operation[0] == "jmpr" and operation[1] is self]
+        children = self.body.live_children()
+        if children and isinstance(children[-1], InlineReturn):
+            del result[returns.pop():]
+        for index in returns:
+            result[index] = ("jmpr", len(result) - index - 1)
+        return result, osp + return_type.size
+
+
+class IntInlineFunctionCall(InlineFunctionCall, IntExpression):
+    definition_type = IntFunctionDefinition
+
+
+class CharInlineFunctionCall(InlineFunctionCall, CharExpression):
+    definition_type = CharFunctionDefinition
+
+
+class FloatInlineFunctionCall(InlineFunctionCall, FloatExpression):
+    definition_type = FloatFunctionDefinition
+
+
+class InlineReturn(Statement):
+    """A return statement of an inlined function body stores its result and
+    jumps to the continuation of the `InlineFunctionCall` `call`, after
+    releasing the arguments along with the locals."""
+    terminal = True
+
+    def __init__(self, call, parent):
+        super(InlineReturn, self).__init__(parent)
+
+        self.call = call
+
+    def generate(self, sp):
+        osp = sp
+        result = []
+        definition = self.call.definition
+
+        # pop result to its address if not void
+        if hasattr(definition, "result"):
+            code, sp = self.children[0].generate(sp)
+            assert sp - osp == definition.return_type.size, \
+                "Code generator error"
+            result.extend(code)
+
+            code, sp = definition.return_type.pop(
+                definition.result.addr(sp), sp)
+            assert sp == osp, "Code generation error"
+            result.extend(code)
+
+        # the call resolves the jump once its end is known
+        if sp != self.call.sp:
+            result.append(("release", sp - self.call.sp))
+        result.append(("jmpr", self.call))
         return result, osp
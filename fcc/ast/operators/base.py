@@ -1,9 +1,113 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
+from fcc.ast.expressions import (IntExpression, CharExpression,
+                                 IntConstantExpression,
+                                 CharConstantExpression)
 from fcc.ast.variables import VariableReference
 from fcc.ast.base import Expression
 
+# the relative jumps that are taken when the comparison with the same
+# operation holds, and when it does not; float ordering comparisons have no
+# jump of the latter kind, because their opposites do not hold for NaNs
+comparisons = {
+    "eqi": "jeqi", "neqi": "jnei", "gti": "jgti", "gtei": "jgei",
+    "lti": "jlti", "ltei": "jlei",
+    "eqc": "jeqc", "neqc": "jnec", "gtc": "jgtc", "gtec": "jgec",
+    "ltc": "jltc", "ltec": "jlec",
+    "eqf": "jeqf", "neqf": "jnef", "gtf": "jgtf", "gtef": "jgef",
+    "ltf": "jltf", "ltef": "jlef"
+}
+negations = {
+    "eqi": "jnei", "neqi": "jeqi", "gti": "jlei", "gtei": "jlti",
+    "lti": "jgei", "ltei": "jgti",
+    "eqc": "jnec", "neqc": "jeqc", "gtc": "jlec", "gtec": "jltc",
+    "ltc": "jgec", "ltec": "jgtc",
+    "eqf": "jnef", "neqf": "jeqf"
+}
+
+
+def truth(expression):
+    """Returns the truth value of `expression` if it is an int or char
+    constant, or None otherwise."""
+    if isinstance(expression, CharConstantExpression):
+        return ord(expression.value) != 0
+    if isinstance(expression, IntConstantExpression):
+        return expression.value != 0
+    return None
+
+
+def branch(expression, sp, when):
+    """Returns the code that evaluates `expression` and jumps if its truth
+    value is `when`, along with the indices of those jumps. Their offsets are
+    left out, and must be set by `resolve` once the target is known.
+
+    Comparisons are fused with the jump, so that no flag is pushed, and
+    logical operators jump as soon as their first operand decides the
+    result. Constants either always jump or never do, and other int and
+    float expressions are compared with zero."""
+    osp = sp
+    value = truth(expression)
+    if value is not None:
+        if value == when:
+            return [("jmpr", None)], [0]
+        return [], []
+
+    if isinstance(expression, LogicalOperator):
+        first = truth(expression.first)
+        if first == expression.shortcut:
+            # the constant first operand decides the result
+            return branch(expression.first, sp, when)
+        if first is not None:
+            return branch(expression.second, sp, when)
+        if truth(expression.second) not in (None, expression.shortcut):
+            # the first operand still decides the result
+            return branch(expression.first, sp, when)
+
+        if when == expression.shortcut:
+            # either operand may decide the result
+            result, exits = branch(expression.first, sp, when)
+            code, more = branch(expression.second, sp, when)
+            exits.extend(len(result) + index for index in more)
+            result.extend(code)
+        else:
+            # the first operand may only skip the second one
+            result, skips = branch(expression.first, sp, expression.shortcut)
+            code, exits = branch(expression.second, sp, when)
+            exits = [len(result) + index for index in exits]
+            result.extend(code)
+            resolve(result, skips)
+        return result, exits
+
+    jumps = comparisons if when else negations
+    operation = getattr(expression, "operation", ("", ))[0]
+    if operation in jumps:
+        # evaluate the operands only; the jump compares them
+        result, sp = expression.first.generate(sp)
+        code, sp = expression.second.generate(sp)
+        result.extend(code)
+        assert sp - osp == 2 * expression.operand_type.size, \
+            "Code generator error"
+        result.append((jumps[operation], None))
+    else:
+        result, sp = expression.generate(sp)
+        assert sp - osp == expression.size, "Code generator error"
+        if isinstance(expression, CharExpression):
+            result.append(("jmp1r" if when else "jmp0r", None))
+        elif isinstance(expression, IntExpression):
+            result.extend([("loadi", 0), ("jnei" if when else "jeqi", None)])
+        else:
+            result.extend([("loadf", 0.0),
+                           ("jnef" if when else "jeqf", None)])
+    return result, [len(result) - 1]
+
+
+def resolve(code, jumps, offset=0):
+    """Makes the relative jumps at the `jumps` indices of `code` land
+    `offset` instructions after its end."""
+    for index in jumps:
+        code[index] = (code[index][0], len(code) - index - 1 + offset)
+
 # ---------
 # operators
 # ---------
@@ -107,3 +211,32 @@ class AssignmentOperator(BinaryOperator):
 
         assert sp - osp == self.size, "Code generator error"
         return result, sp
+
+
+class LogicalOperator(BinaryOperator):
+    """A logical operator only evaluates its second operand if the first one
+    does not decide the result by itself, that is if its truth value is not
+    `shortcut`. The result is 1 if the operator holds and 0 otherwise."""
+    shortcut = None
+
+    def live_children(self):
+        """The second operand never runs if the first one is a constant that
+        decides the result."""
+        if truth(self.first) == self.shortcut:
+            return self.children[:1]
+        return self.children
+
+    def generate(self, sp):
+        result, exits = branch(self, sp, False)
+        result.extend([("loadc", 1), ("jmpr", 1)])
+        resolve(result, exits)
+        result.append(("loadc", 0))
+        return result, sp + self.size
+
+
+class LogicalConjunction(LogicalOperator):
+    shortcut = False
+
+
+class LogicalDisjunction(LogicalOperator):
+    shortcut = True
@@ -2,7 +2,8 @@
 from __future__ import absolute_import, unicode_literals, division
 
 from fcc.ast.operators.base import (UnaryOperator, BinaryOperator,
-                                    AssignmentOperator)
+                                    AssignmentOperator, LogicalConjunction,
+                                    LogicalDisjunction)
 from fcc.ast.expressions import CharExpression, IntExpression, FloatExpression
 
 # -------------------
@@ -93,12 +94,14 @@ class CharRightShift(BinaryCharOperator, CharExpression):
 # ----------------------------
 
 
-class CharLogicalConjunction(BinaryCharOperator, CharExpression):
-    operation = "landc",
+class CharLogicalConjunction(LogicalConjunction, BinaryCharOperator,
+                              CharExpression):
+    pass
 
 
-class CharLogicalDisjunction(BinaryCharOperator, CharExpression):
-    operation = "lorc",
+class CharLogicalDisjunction(LogicalDisjunction, BinaryCharOperator,
+                              CharExpression):
+    pass
 
 
 class CharLogicalNegation(UnaryCharOperator, CharExpression):
@@ -2,7 +2,8 @@
 from __future__ import absolute_import, unicode_literals, division
 
 from fcc.ast.operators.base import (UnaryOperator, BinaryOperator,
-                                    AssignmentOperator)
+                                    AssignmentOperator, LogicalConjunction,
+                                    LogicalDisjunction)
 from fcc.ast.expressions import CharExpression, IntExpression, FloatExpression
 
 # ------------------------
@@ -64,12 +65,14 @@ class FloatAdditiveNegation(UnaryFloatOperator, FloatExpression):
 # ---------------------------------
 
 
-class FloatLogicalConjunction(BinaryFloatOperator, CharExpression):
-    operation = "landf",
+class FloatLogicalConjunction(LogicalConjunction, BinaryFloatOperator,
+                               CharExpression):
+    pass
 
 
-class FloatLogicalDisjunction(BinaryFloatOperator, CharExpression):
-    operation = "lorf",
+class FloatLogicalDisjunction(LogicalDisjunction, BinaryFloatOperator,
+                               CharExpression):
+    pass
 
 
 class FloatLogicalNegation(UnaryFloatOperator, IntExpression):
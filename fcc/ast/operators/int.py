@@ -2,7 +2,8 @@
 from __future__ import absolute_import, unicode_literals, division
 
 from fcc.ast.operators.base import (UnaryOperator, BinaryOperator,
-                                    AssignmentOperator)
+                                    AssignmentOperator, LogicalConjunction,
+                                    LogicalDisjunction)
 from fcc.ast.expressions import CharExpression, IntExpression, FloatExpression
 
 # -----------------
@@ -93,12 +94,14 @@ class IntRightShift(BinaryIntOperator, IntExpression):
 # --------------------------
 
 
-class IntLogicalConjunction(BinaryIntOperator, CharExpression):
-    operation = "landi",
+class IntLogicalConjunction(LogicalConjunction, BinaryIntOperator,
+                             CharExpression):
+    pass
 
 
-class IntLogicalDisjunction(BinaryIntOperator, CharExpression):
-    operation = "lori",
+class IntLogicalDisjunction(LogicalDisjunction, BinaryIntOperator,
+                             CharExpression):
+    pass
 
 
 class IntLogicalNegation(UnaryIntOperator, IntExpression):
@@ -1,6 +1,7 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
+from fcc.ast.operators.base import branch, resolve, truth
 from fcc.ast.expressions import CharExpression
 from fcc.ast.base import Statement
 
@@ -22,11 +23,25 @@ class IfStatement(Statement):
             assert isinstance(self.children[2], Statement), \
                 "Statement expected"
 
+    def live_children(self):
+        """Only the branch that is taken runs if the condition is constant."""
+        value = truth(self.children[0])
+        if value is None:
+            return self.children
+        return self.children[1:2] if value else self.children[2:]
+
     def generate(self, sp):
         osp = sp
+        if truth(self.children[0]) is not None:
+            result = []
+            for child in self.live_children():
+                code, sp = child.generate(osp)
+                assert sp == osp, "Code generator error"
+                result.extend(code)
+            return result, osp
+
         # evaluate condition
-        result, sp = self.children[0].generate(sp)
-        assert sp - osp == CharExpression.size, "Code generator error"
+        result, exits = branch(self.children[0], sp, False)
 
         # generate the 'then' block
         then, sp = self.children[1].generate(osp)
@@ -41,10 +56,10 @@ class IfStatement(Statement):
             # is executed
             then.append(("jmpr", len(_else)))
 
-        # add the conditional jump; if the condition is false, jump to the end
-        # of the 'then' branch (which will be either the start of the 'else'
-        # branch, or the following statement)
-        result.append(("jmp0r", len(then)))
+        # if the condition is false, jump to the end of the 'then' branch
+        # (which will be either the start of the 'else' branch, or the
+        # following statement)
+        resolve(result, exits, len(then))
         result.extend(then)
         if len(self.children) == 3:
             result.extend(_else)
@@ -1,6 +1,7 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
+from fcc.ast.operators.base import branch, resolve, truth
 from fcc.ast.expressions import CharExpression
 from fcc.ast.base import Statement
 
@@ -20,22 +21,29 @@ class WhileStatement(Statement):
         assert isinstance(self.children[1], Statement), \
             "Statement expected"
 
+    def live_children(self):
+        """Loops whose condition is constantly false never run."""
+        if truth(self.children[0]) is False:
+            return []
+        return self.children
+
     def generate(self, sp):
         osp = sp
+        if not self.live_children():
+            return [], osp
+
         # evaluate condition
-        result, sp = self.children[0].generate(sp)
-        assert sp - osp == CharExpression.size, "Code generator error"
+        result, exits = branch(self.children[0], sp, False)
 
         # generate the 'repeated' block
         loop, sp = self.children[1].generate(osp)
         assert sp == osp, "Code generator error"
         # add an unconditional jump to re-evaluate the condition after the
         # block is executed
-        loop.append(("jmpr", -len(loop) - len(result) - 2))
+        loop.append(("jmpr", -len(loop) - len(result) - 1))
 
-        # add a conditional jump after the expression is evaluated to test
-        # whether the loop should be broken or not
-        result.append(("jmp0r", len(loop)))
+        # the condition breaks the loop by jumping past its end
+        resolve(result, exits, len(loop))
         result.extend(loop)
 
         return result, osp
@@ -0,0 +1,4 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.backends.python import *  # noqa
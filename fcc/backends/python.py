@@ -0,0 +1,448 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.vm.exceptions import DivisionByZero, StackOverflow
+from fcc import ast
+
+from ctypes import c_long, py_object, pythonapi
+from keyword import iskeyword
+from struct import Struct
+from types import ModuleType
+import re
+import sys
+import threading
+
+_float = Struct(b"f")
+
+# the bytes of native stack that the python interpreter takes for every call
+# (about 1.3 KiB each on x86-64), with room to spare
+CALL_STACK = 2048
+
+# the `depth` of every program that is running, and the recursion limit from
+# before the first of them started
+_running = []
+_limit = [None]
+_lock = threading.Lock()
+
+# wraps a python integer expression to 32 bits two's complement
+I32 = "((({0}) + 2147483648 & 4294967295) - 2147483648)"
+
+# python templates for every operator, indexed by AST class name; {0} and {1}
+# are replaced by the (already translated) operands
+operators = {
+    # integer operators
+    "IntAddition": I32.format("{0} + {1}"),
+    "IntSubstraction": I32.format("{0} - {1}"),
+    "IntMultiplication": I32.format("{0} * {1}"),
+    "IntDivision": I32.format("{0} // {1}"),
+    "IntModulus": "({0} % {1})",
+    "IntAdditiveNegation": I32.format("-{0}"),
+    "IntBitwiseConjunction": "({0} & {1})",
+    "IntBitwiseDisjunction": "({0} | {1})",
+    "IntExclusiveDisjunction": "({0} ^ {1})",
+    "IntBitwiseNegation": "(~{0})",
+    "IntLeftShift": I32.format("{0} << {1}"),
+    "IntRightShift": "({0} >> {1})",
+    "IntToCharConversion": "({0} & 255)",
+    "IntToFloatConversion": "_f32({0})",
+    "IntBacktick": "_print({0})",
+
+    # character operators
+    "CharAddition": "(({0} + {1}) & 255)",
+    "CharSubstraction": "(({0} - {1}) & 255)",
+    "CharMultiplication": "(({0} * {1}) & 255)",
+    "CharDivision": "({0} // {1})",
+    "CharModulus": "({0} % {1})",
+    "CharAdditiveNegation": "(-{0} & 255)",
+    "CharBitwiseConjunction": "({0} & {1})",
+    "CharBitwiseDisjunction": "({0} | {1})",
+    "CharExclusiveDisjunction": "({0} ^ {1})",
+    "CharBitwiseNegation": "(~{0} & 255)",
+    "CharLeftShift": "(({0} << {1}) & 255)",
+    "CharRightShift": "({0} >> {1})",
+    "CharToIntConversion": "{0}",
+    "CharToFloatConversion": "float({0})",
+    "CharBacktick": "_print({0})",
+
+    # floating point operators
+    "FloatAddition": "_f32({0} + {1})",
+    "FloatSubstraction": "_f32({0} - {1})",
+    "FloatMultiplication": "_f32({0} * {1})",
+    "FloatDivision": "_f32({0} / {1})",
+    "FloatExponentiation": "_f32({0} ** {1})",
+    "FloatAdditiveNegation": "(-{0})",
+    "FloatToCharConversion": "(int({0}) & 255)",
+    "FloatToIntConversion": I32.format("int({0})"),
+    "FloatBacktick": "_print({0})"
+}
+
+# python templates for operators that produce a truth value; they are used
+# as-is by `if` and `while` conditions, and converted to 0 / 1 otherwise
+conditions = {}
+for prefix in ("Int", "Char", "Float"):
+    conditions.update({
+        prefix + "EqualityComparison": "{0} == {1}",
+        prefix + "InequalityComparison": "{0} != {1}",
+        prefix + "GreaterThanComparison": "{0} > {1}",
+        prefix + "GreaterThanOrEqualComparison": "{0} >= {1}",
+        prefix + "LessThanComparison": "{0} < {1}",
+        prefix + "LessThanOrEqualComparison": "{0} <= {1}",
+        prefix + "LogicalConjunction": "{0} and {1}",
+        prefix + "LogicalDisjunction": "{0} or {1}",
+        prefix + "LogicalNegation": "not {0}"
+    })
+
+_constant = re.compile(r"^-?[0-9.e+-]+$")
+_temporary = re.compile(r"^t_[0-9]+$")
+_atom = re.compile(r"^[\w.-]+$")
+
+template = """\
+def _run():
+{globals}
+    try:
+        f_main()
+    except ZeroDivisionError:
+        raise DivisionByZero
+    except RuntimeError as error:
+        # python 2 has no RecursionError; other errors are not overflows
+        if "maximum recursion depth" not in str(error):
+            raise
+        raise StackOverflow
+"""
+
+
+def _f32(value):
+    """Rounds `value` to the nearest single precision float."""
+    return _float.unpack(_float.pack(value))[0]
+
+
+def _print(value):
+    print value
+    return value
+
+
+class FullCirclePythonProgram(ModuleType):
+    """The module that a program is translated into. Python 2 clears the
+    globals of a module once it is freed, so `run` is a method rather than
+    one of them: it keeps the module alive while the program runs, even if
+    nothing else refers to it (as in `compile().run()`)."""
+    def run(self, depth=100000):
+        """Initializes the global variables and calls `main`. Calls may be
+        nested `depth` deep, which takes more stack than python's main
+        thread has, so the program runs in a thread of its own. Tail calls
+        count as well, as python does not eliminate them; deeper programs
+        raise `StackOverflow`."""
+        errors = []
+
+        def target():
+            try:
+                self._run()
+            except Exception:
+                errors.append(sys.exc_info())
+
+        with _lock:
+            # the recursion limit is shared by every thread, so it is only
+            # restored once no program runs
+            if not _running:
+                _limit[0] = sys.getrecursionlimit()
+            _running.append(depth)
+            sys.setrecursionlimit(max(_limit[0], max(_running) + 50))
+            size = threading.stack_size(depth * CALL_STACK + (1 << 20))
+            try:
+                thread = threading.Thread(target=target)
+                thread.start()
+            finally:
+                threading.stack_size(size)
+        try:
+            # joining with a timeout lets signals reach this thread (such as
+            # a KeyboardInterrupt) while the program runs
+            while thread.is_alive():
+                thread.join(0.05)
+        except BaseException:
+            # stop the program before passing the error on
+            pythonapi.PyThreadState_SetAsyncExc(c_long(thread.ident),
+                                                py_object(SystemExit))
+            thread.join()
+            raise
+        finally:
+            with _lock:
+                _running.remove(depth)
+                if not _running:
+                    sys.setrecursionlimit(_limit[0])
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+
+class FullCirclePythonGenerator(object):
+    def __init__(self, root):
+        """Creates a generator that translates the validated `GlobalBlock`
+        `root` into python source code. Every function is translated into a
+        python function of the same name (prefixed with 'f_'), and local
+        variables become python variables.
+
+        Functions that end without returning a value return 0 (or 0.0),
+        while on the virtual machines they return whatever their return
+        slot holds; C leaves that value undefined."""
+        self.root = root
+
+    def compile(self):
+        """Returns a new `FullCirclePythonProgram` module that contains the
+        translated program. The program may be executed by calling its `run`
+        method, and its source code is available as `__source__`."""
+        source = self.generate()
+        module = FullCirclePythonProgram(str("fcc_program"))
+        module.__dict__.update({
+            "_f32": _f32,
+            "_print": _print,
+            "DivisionByZero": DivisionByZero,
+            "StackOverflow": StackOverflow,
+            "__source__": source
+        })
+        exec compile(source, "<fcc>", "exec") in module.__dict__
+        return module
+
+    def generate(self):
+        """Returns the python source code of the program."""
+        self.names = {}
+        self.globals = set()
+        self.lines = []
+        self.depth = 0
+
+        # global variables are initialized by `run`, in declaration order
+        names = set()
+        for child in self.root.children:
+            if isinstance(child, ast.VariableDefinition):
+                self.names[child] = self.unique("g_" + child.name, names)
+                self.globals.add(self.names[child])
+
+        functions = []
+        for child in self.root.children:
+            if isinstance(child, ast.FunctionDefinition):
+                functions.append(self.function(child))
+
+        self.start_function()
+        self.depth = 1
+        for child in self.root.children:
+            if isinstance(child, ast.VariableDefinition):
+                self.variable(child)
+        init = self.render()
+        if self.globals:
+            init = "    global %s\n%s" % (", ".join(sorted(self.globals)),
+                                          init)
+
+        return "\n\n".join(functions + [template.format(globals=init)])
+
+    # helpers
+    def unique(self, name, taken):
+        """Returns `name`, or `name` followed by a number if it is already in
+        `taken` (and adds the result to it)."""
+        result, index = name, 1
+        while result in taken or iskeyword(result):
+            index += 1
+            result = "%s_%d" % (name, index)
+        taken.add(result)
+        return result
+
+    def start_function(self):
+        self.lines = []
+        self.locals = set()
+        self.assigned = set()
+        self.temporaries = 0
+
+    def emit(self, line):
+        self.lines.append((self.depth, line))
+
+    def render(self):
+        return "".join("    " * depth + line + "\n"
+                       for depth, line in self.lines)
+
+    def temporary(self):
+        self.temporaries += 1
+        return "t_%d" % self.temporaries
+
+    def materialize(self, code):
+        """Stores the value of `code` in a temporary variable unless it is a
+        constant, and returns the expression that refers to it."""
+        if _constant.match(code):
+            return code
+        name = self.temporary()
+        self.emit("%s = %s" % (name, code))
+        return name
+
+    def isolate(self, node, method=None):
+        """Translates `node` and returns the resulting expression together
+        with the statements that had to be emitted to compute it (which are
+        removed from the output)."""
+        mark = len(self.lines)
+        code = (method or self.expression)(node)
+        pending = self.lines[mark:]
+        del self.lines[mark:]
+        return code, pending
+
+    def operands(self, nodes):
+        """Translates a list of expressions that must be evaluated in order.
+        If an expression needs statements to be emitted before it, previous
+        operands are stored in temporary variables first."""
+        result = []
+        for node in nodes:
+            code, pending = self.isolate(node)
+            if pending:
+                result = [self.materialize(item) for item in result]
+                self.lines.extend(pending)
+            result.append(code)
+        return result
+
+    # statements
+    def function(self, definition):
+        self.start_function()
+        self.depth = 1
+        self.names[definition] = "f_" + definition.name
+        arguments = []
+        for argument in definition.arguments:
+            self.names[argument] = self.unique("l_" + argument.name,
+                                               self.locals)
+            arguments.append(self.names[argument])
+
+        for child in definition.children:
+            self.statement(child)
+
+        if definition.return_type is not ast.Expression:
+            # falling off the end of a non-void function
+            self.emit("return %s" % self.default(definition.return_type))
+        elif not self.lines:
+            self.emit("return")
+
+        body = self.render()
+        if self.assigned:
+            body = "    global %s\n%s" % (", ".join(sorted(self.assigned)),
+                                          body)
+        return "def f_%s(%s):\n%s" % (definition.name, ", ".join(arguments),
+                                      body)
+
+    def default(self, expression_type):
+        if issubclass(expression_type, ast.FloatExpression):
+            return "0.0"
+        return "0"
+
+    def statement(self, node):
+        if isinstance(node, ast.VariableDefinition):
+            self.names[node] = self.unique("l_" + node.name, self.locals)
+            self.variable(node)
+        elif isinstance(node, ast.DiscardExpressionStatement):
+            code = self.expression(node.children[0])
+            if not _atom.match(code):
+                self.emit(code)
+        elif isinstance(node, ast.IfStatement):
+            code = self.condition(node.children[0])
+            self.emit("if %s:" % code)
+            self.block(node.children[1])
+            if len(node.children) == 3:
+                self.emit("else:")
+                self.block(node.children[2])
+        elif isinstance(node, ast.WhileStatement):
+            code, pending = self.isolate(node.children[0], self.condition)
+            if pending:
+                self.emit("while True:")
+                self.depth += 1
+                self.lines.extend((depth + 1, line)
+                                  for depth, line in pending)
+                self.emit("if not (%s):" % code)
+                self.emit("    break")
+                self.depth -= 1
+            else:
+                self.emit("while %s:" % code)
+            self.block(node.children[1])
+        elif isinstance(node, ast.FunctionReturn):
+            if node.children:
+                self.emit("return " + self.expression(node.children[0]))
+            else:
+                self.emit("return")
+        elif isinstance(node, ast.Block):
+            for child in node.children:
+                self.statement(child)
+        else:
+            assert False, "Unsupported statement '%s'" % \
+                node.__class__.__name__
+
+    def block(self, node):
+        """Translates `node` as the indented body of a compound statement."""
+        self.depth += 1
+        mark = len(self.lines)
+        self.statement(node)
+        if len(self.lines) == mark:
+            self.emit("pass")
+        self.depth -= 1
+
+    def variable(self, node):
+        if node.children:
+            code = self.expression(node.children[0])
+        else:
+            code = self.default(node.expression_type)
+        self.emit("%s = %s" % (self.names[node], code))
+
+    # expressions
+    def condition(self, node):
+        """Translates `node` into a python expression whose truth value is
+        the same as that of `node`."""
+        name = node.__class__.__name__
+        if name not in conditions:
+            return self.expression(node)
+
+        if name.endswith("Negation"):
+            return "not %s" % self.condition(node.children[0])
+
+        if name.endswith(("Conjunction", "Disjunction")):
+            first = self.condition(node.children[0])
+            second, pending = self.isolate(node.children[1], self.condition)
+            if pending:
+                # the second operand has side effects; only evaluate them if
+                # needed
+                return self.short_circuit(name, first, second, pending)
+            return "(%s)" % conditions[name].format(first, second)
+        return conditions[name].format(*self.operands(node.children))
+
+    def short_circuit(self, name, first, second, pending):
+        result = self.temporary()
+        if name.endswith("Conjunction"):
+            self.emit("%s = 0" % result)
+            self.emit("if %s:" % first)
+        else:
+            self.emit("%s = 1" % result)
+            self.emit("if not (%s):" % first)
+        self.lines.extend((depth + 1, line) for depth, line in pending)
+        self.emit("    %s = 1 if %s else 0" % (result, second))
+        return result
+
+    def expression(self, node):
+        name = node.__class__.__name__
+        if isinstance(node, ast.IntConstantExpression):
+            return repr(((node.value + 2 ** 31) & (2 ** 32 - 1)) - 2 ** 31)
+        elif isinstance(node, ast.CharConstantExpression):
+            return repr(ord(node.value) & 255)
+        elif isinstance(node, ast.FloatConstantExpression):
+            return repr(_f32(node.value))
+        elif isinstance(node, ast.VariableReference):
+            return self.names[node.definition]
+        elif isinstance(node, ast.AssignmentOperator):
+            code = self.expression(node.second)
+            target = self.names[node.first.definition]
+            if target in self.globals:
+                self.assigned.add(target)
+            self.emit("%s = %s" % (target, code))
+            return target
+        elif isinstance(node, ast.CommaOperator):
+            code = self.expression(node.first)
+            if not _constant.match(code):
+                self.emit(code)
+            return self.expression(node.second)
+        elif isinstance(node, ast.FunctionCall):
+            return "f_%s(%s)" % (node.definition.name,
+                                 ", ".join(self.operands(node.children)))
+        elif name in conditions:
+            code = self.condition(node)
+            if _temporary.match(code):
+                return code
+            return "(1 if %s else 0)" % code
+        elif name in operators:
+            return operators[name].format(*self.operands(node.children))
+        assert False, "Unsupported expression '%s'" % name
@@ -0,0 +1,114 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.optimizer.inlining import threshold
+from fcc.vm.bytecode import Bytecode, FORMAT_VERSION
+
+from collections import OrderedDict
+from hashlib import sha1
+from tempfile import mkstemp
+from threading import Lock
+import os
+
+
+class CompileCache(object):
+    """Caches the bytecode of compiled programs, keyed by a hash of their
+    source code, of the options they are compiled with and of the compiler
+    version. Up to `size` programs are kept in memory, and the least
+    recently used one is evicted when that limit is exceeded. If `directory`
+    is set, programs are also stored there as .fbc files so that they
+    survive the process.
+
+    `hits`, `misses` and `evictions` count lookups that were served from the
+    cache (in memory or on disk), lookups that required compilation, and
+    programs evicted from memory. Evicting a program only drops the cache's
+    reference to it, as callers may still be running it; programs loaded
+    from disk stay mapped until they are closed or garbage collected."""
+    def __init__(self, size=256, directory=None):
+        assert size > 0, "Cache size must be positive"
+        self.size = size
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def key(self, source, inline_threshold=threshold):
+        """Returns the cache key of `source` when compiled with the options
+        given (see `fcc.compile`)."""
+        from fcc import __version__, CODE_REVISION
+
+        if isinstance(source, unicode):
+            source = source.encode("utf-8")
+        prefix = "%s:%d:%d:%d:" % (__version__, FORMAT_VERSION, CODE_REVISION,
+                                   inline_threshold)
+        return sha1(prefix.encode("ascii") + source).hexdigest()
+
+    def compile(self, source, inline_threshold=threshold):
+        """Returns the bytecode of `source` compiled with the options given
+        (see `fcc.compile`), compiling it only if it is not already
+        cached."""
+        key = self.key(source, inline_threshold)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                bytecode = self.entries.pop(key)
+                self.entries[key] = bytecode
+                return bytecode
+
+        path = None
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + ".fbc")
+
+        if path is not None and os.path.exists(path):
+            bytecode = Bytecode.load(path)
+            hit = True
+        else:
+            from fcc import lex, parse, compile
+
+            bytecode = compile(parse(lex(source)),
+                               inline_threshold=inline_threshold)
+            hit = False
+            if path is not None:
+                # write to a temporary file first, so that readers never see
+                # a partially written program; every writer (thread or
+                # process) gets a file of its own
+                handle, temp = mkstemp(suffix=".tmp", dir=self.directory)
+                os.close(handle)
+                try:
+                    bytecode.save(temp)
+                    os.rename(temp, path)
+                except Exception:
+                    os.remove(temp)
+                    raise
+
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.entries.pop(key, None)
+            self.entries[key] = bytecode
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return bytecode
+
+    def clear(self):
+        """Removes every program from memory (but not from disk)."""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def __contains__(self, item):
+        """Checks whether a program is in memory: `source in cache` looks for
+        `source` compiled with the default options, and `(source,
+        inline_threshold) in cache` for the options given."""
+        if isinstance(item, tuple):
+            key = self.key(*item)
+        else:
+            key = self.key(item)
+        with self.lock:
+            return key in self.entries
@@ -3,7 +3,7 @@ from __future__ import absolute_import, unicode_literals, division
 
 from fcc import tokens
 
-from string import whitespace
+import re
 
 
 class FullCircleLexer(object):
@@ -86,104 +86,123 @@ class FullCircleLexer(object):
         (";", tokens.SemicolonToken)
     ]
 
+    # comments and static tokens must be tried before everything else, and
+    # static tokens must be tried in the order in which they are listed
+    # above, so that keywords win over identifiers and longer operators over
+    # their prefixes
+    pattern = re.compile("|".join([
+        r"(?P<comment>//[^\r\n]*[\r\n]?)",
+        r"(?P<block>/\*(?:/|[\s\S]*?\*/|[\s\S]*))",
+        "(?P<static>%s)" % "|".join(re.escape(token) for token, _ in tokens),
+        r"(?P<whitespace>[ \t\x0b\x0c\r\n]+)",
+        r"(?P<number>[0-9][0-9a-fA-FxX.]*)",
+        r"""(?P<string>'(?:\\[\s\S]|[^'\\])*'|"(?:\\[\s\S]|[^"\\])*")""",
+        r"(?P<quote>['\"])",
+        r"(?P<identifier>[_a-zA-Z][_a-zA-Z0-9]*)"
+    ]))
+    lookahead = max(len(token) for token, _ in tokens)
+    escapes = re.compile(r"\\([\s\S])|[^\\]+")
+
     def __init__(self, data):
         self.data = data
         self.position = 0
-        self.line = self.column = 1
         self.limit = len(data)
+        self.classes = dict(self.tokens)
+
+        # `self.base` is the offset of `self.data` in the whole source
+        self.base = 0
+        self.index = tokens.LineIndex(data)
 
     def lex(self):
-        """Parses `self.data` and returns an array of tokens. Raises an
+        """Parses `self.data` and returns a `TokenStream`. Raises an
         exception on error."""
-        result = []
+        stream = tokens.TokenStream(self.index)
+        append = stream.append
+        for cls, offset, value in self.scan():
+            append(cls, offset, value)
+        return stream
+
+    @classmethod
+    def iter_lex(cls, source, size=65536):
+        """Parses `source`, which may be any object with a `read` method
+        (such as a file or an `mmap`), and yields its tokens as they are
+        found. The source is read `size` characters at a time, so that only
+        the current chunk and the token being parsed are kept in memory.
+        Raises an exception on error."""
+        lexer = cls("")
+        while True:
+            chunk = source.read(size)
+            final = not chunk
+            lexer.index.feed(chunk)
+
+            # keep the characters that could not be parsed yet, since they
+            # may be the beginning of a token that continues in this chunk
+            lexer.data = lexer.data[lexer.position:] + chunk
+            lexer.base += lexer.position
+            lexer.limit = len(lexer.data)
+            lexer.position = 0
+
+            for cls, offset, value in lexer.scan(final):
+                yield cls.build(offset, lexer.index, value)
+            if final:
+                return
+            if lexer.position == 0:
+                # a single token spans the whole buffer; read larger chunks
+                # so that it is not scanned again for every new chunk
+                size *= 2
+
+    def scan(self, final=True):
+        """Yields a (`class`, `offset`, `value`) tuple for every token that
+        begins between `self.position` and the end of `self.data`, where
+        `value` is the name of identifiers, the value of constants and None
+        for other tokens. Unless `final` is set, `self.data` is assumed to be
+        incomplete and scanning stops before the first token that may
+        continue past its end."""
+        match = self.pattern.match
         while self.position < self.limit:
-            if self.data.startswith("//", self.position):
-                # inline comment
-                self.skip_inline_comment()
-            elif self.data.startswith("/*", self.position):
-                # multiline comment
-                self.skip_multiline_comment()
-            else:
-                for token, cls in self.tokens:
-                    # check for static tokens
-                    if self.data.startswith(token, self.position):
-                        # static token found; add and advance
-                        result.append(cls(self.line, self.column))
-                        self.position += len(token)
-                        self.column += len(token)
-                        break
-                else:
-                    # no static tokens begin at this position
-
-                    if self.data[self.position] in "\r\n":
-                        # newline
-                        self.skip_newline()
-                    elif self.data[self.position] in whitespace:
-                        # non-newline whitespace
-                        self.skip_whitespace()
-                    elif self.data[self.position] in "0123456789.":
-                        # numeric constant
-                        result.append(self.parse_numeric_constant())
-                    elif self.data[self.position] in "'\"":
-                        # string or character constant
-                        result.append(self.parse_string_constant())
-                    elif self.data[self.position].lower() in \
-                            "_abcdefghijklmnopqrstuvwxyz":
-                        # identifier
-                        result.append(self.parse_identifier())
-                    else:
-                        raise ValueError("Unexpected symbol")
-        return result
-
-    def skip_inline_comment(self):
-        """Skip characters until the end of the line"""
-        while self.data[self.position] not in "\r\n":
-            self.skip_whitespace()
-            if self.position == self.limit:
-                break  # reached EOF
-        else:
-            self.skip_newline()
-
-    def skip_multiline_comment(self):
-        """Skip characters until */ is found."""
-        while not self.data.startswith("*/", self.position):
-            if self.data[self.position] in "\r\n":
-                self.skip_newline()
-            else:
-                self.skip_whitespace()
-
-            if self.position == self.limit:
-                break  # reached EOF
-        else:
-            self.skip_whitespace()
-            self.skip_whitespace()
-
-    def skip_newline(self):
-        self.line += 1
-        self.column = 1
-        self.position += 1
-
-    def skip_whitespace(self):
-        self.column += 1
-        self.position += 1
-
-    def parse_numeric_constant(self):
-        value = ""
-
-        while self.data[self.position].lower() in "0123456789abcdefx.":
-            value += self.data[self.position].lower()
-            self.skip_whitespace()
-
-            if self.position == self.limit:
-                break  # reached EOF
+            if not final and self.position + self.lookahead > self.limit:
+                # a longer static token might begin here
+                return
+
+            # with `lookahead` characters left, every token but the static
+            # ones matches from its first character on; if nothing matches,
+            # more data would not help
+            found = match(self.data, self.position)
+            if found is None:
+                raise ValueError("Unexpected symbol")
+            if not final and (found.end() == self.limit or
+                              found.lastgroup == "quote"):
+                # the token (or the unterminated constant) may continue in
+                # the next chunk
+                return
+
+            # static tokens are located at their first character, and every
+            # other token at the character that follows it
+            kind, text = found.lastgroup, found.group()
+            self.position = found.end()
+            if kind == "static":
+                yield self.classes[text], self.base + found.start(), None
+            elif kind == "identifier":
+                yield tokens.Identifier, self.base + self.position, text
+            elif kind == "number":
+                cls, value = self.parse_numeric_constant(text.lower())
+                yield cls, self.base + self.position, value
+            elif kind == "string":
+                yield tokens.CharConstant, self.base + self.position, \
+                    self.parse_string_constant(text)
+            elif kind == "quote":
+                # string or character constant without a terminator
+                raise ValueError("Unexpected end of file")
 
+    def parse_numeric_constant(self, value):
+        """Returns the (`class`, `value`) of a numeric constant."""
         if \
                 "." in value or \
                 (value[-1] in "fd" and not value.startswith("0x")):
             # value is explicit floating point
             if value[-1] in "fd":
                 value = value[:-1]
-            return tokens.FloatConstant(float(value), self.line, self.column)
+            return tokens.FloatConstant, float(value)
 
         # value must be an integer
         base = 10
@@ -192,50 +211,16 @@ class FullCircleLexer(object):
                 base = 16
             else:
                 base = 8
-        return tokens.IntConstant(int(value, base), self.line, self.column)
-
-    def parse_string_constant(self):
-        value = ""
-        delimiter = self.data[self.position]
-        self.skip_whitespace()
-        if self.position == self.limit:
-            raise ValueError("Unexpected end of file")
-
-        while self.data[self.position].lower() != delimiter:
-            if self.data[self.position] == "\\":
-                # escape code encountered; read next char to disambiguate
-                self.skip_whitespace()
-                if self.position == self.limit:
-                    # EOF reached without string terminator
-                    raise ValueError("Unexpected end of file")
-
-                if self.data[self.position] in "\r\n":
-                    # escaped newline; ignore both characters
-                    self.skip_newline()
-                else:
-                    # add entire escape sequence to string
-                    value += "\\" + self.data[self.position]
-                    self.skip_whitespace()
-            else:
-                value += self.data[self.position].lower()
-                self.skip_whitespace()
+        return tokens.IntConstant, int(value, base)
 
-            if self.position == self.limit:
-                # EOF reached without string terminator
-                raise ValueError("Unexpected end of file")
-        self.skip_whitespace()
-
-        return tokens.CharConstant(value.decode("string_escape"), self.line,
-                                   self.column)
-
-    def parse_identifier(self):
+    def parse_string_constant(self, text):
         value = ""
-        while self.data[self.position].lower() in \
-                "_abcdefghijklmnopqrstuvwxyz0123456789":
-            value += self.data[self.position]
-
-            self.skip_whitespace()
-            if self.position == self.limit:
-                break
-
-        return tokens.Identifier(value, self.line, self.column)
+        for part in self.escapes.finditer(text[1:-1]):
+            escaped = part.group(1)
+            if escaped is None:
+                value += part.group().lower()
+            elif escaped not in "\r\n":
+                # add entire escape sequence to string; escaped newlines are
+                # ignored
+                value += "\\" + escaped
+        return value.decode("string_escape")
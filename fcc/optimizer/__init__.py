@@ -0,0 +1,6 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.optimizer.folding import *  # noqa
+from fcc.optimizer.peephole import *  # noqa
+from fcc.optimizer.inlining import *  # noqa
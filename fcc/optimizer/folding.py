@@ -0,0 +1,210 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.vm import formats
+from fcc import ast
+
+from operator import add, sub, mul, pow, and_, or_, xor, lshift, rshift, \
+    eq, ne, gt, ge, lt, le
+from struct import error
+
+
+def _divide(a, b):
+    if b == 0:
+        raise ZeroDivisionError
+    return a // b
+
+
+def _modulo(a, b):
+    if b == 0:
+        raise ZeroDivisionError
+    return a % b
+
+
+def _shift(operation):
+    def shift(a, b):
+        if b < 0:
+            raise ValueError("negative shift count")
+        return operation(a, b)
+    return shift
+
+
+def _compare(operation):
+    return lambda a, b: 1 if operation(a, b) else 0
+
+
+# (operand type, result type, function) of every binary operation that may be
+# evaluated at compile time, keyed by instruction name. Functions receive the
+# left operand followed by the right one and compute the same value as the
+# virtual machine. Logical operators are compiled to jumps rather than to
+# an instruction of their own, and are not folded.
+operations = {
+    # integer
+    "addi": (int, int, add),
+    "subi": (int, int, sub),
+    "muli": (int, int, mul),
+    "divi": (int, int, _divide),
+    "modi": (int, int, _modulo),
+    "bandi": (int, int, and_),
+    "bori": (int, int, or_),
+    "xori": (int, int, xor),
+    "shli": (int, int, _shift(lshift)),
+    "shri": (int, int, _shift(rshift)),
+    "eqi": (int, str, _compare(eq)),
+    "neqi": (int, str, _compare(ne)),
+    "gti": (int, str, _compare(gt)),
+    "gtei": (int, str, _compare(ge)),
+    "lti": (int, str, _compare(lt)),
+    "ltei": (int, str, _compare(le)),
+
+    # character
+    "addc": (str, str, add),
+    "subc": (str, str, sub),
+    "mulc": (str, str, mul),
+    "divc": (str, str, _divide),
+    "modc": (str, str, _modulo),
+    "bandc": (str, str, and_),
+    "borc": (str, str, or_),
+    "xorc": (str, str, xor),
+    "shlc": (str, str, _shift(lshift)),
+    "shrc": (str, str, _shift(rshift)),
+    "eqc": (str, str, _compare(eq)),
+    "neqc": (str, str, _compare(ne)),
+    "gtc": (str, str, _compare(gt)),
+    "gtec": (str, str, _compare(ge)),
+    "ltc": (str, str, _compare(lt)),
+    "ltec": (str, str, _compare(le)),
+
+    # floating point
+    "addf": (float, float, add),
+    "subf": (float, float, sub),
+    "mulf": (float, float, mul),
+    "divf": (float, float, lambda a, b: a / b),
+    "powf": (float, float, pow),
+    "eqf": (float, str, _compare(eq)),
+    "neqf": (float, str, _compare(ne)),
+    "gtf": (float, str, _compare(gt)),
+    "gtef": (float, str, _compare(ge)),
+    "ltf": (float, str, _compare(lt)),
+    "ltef": (float, str, _compare(le))
+}
+
+# (left, right) neutral elements of the operations that return their other
+# operand unchanged, keyed by instruction name; None when the operation has
+# no neutral element on that side. x + 0.0 is not simplified, as it turns
+# -0.0 into 0.0.
+identities = {
+    "addi": (0, 0), "addc": (0, 0),
+    "subi": (None, 0), "subc": (None, 0), "subf": (None, 0.0),
+    "muli": (1, 1), "mulc": (1, 1), "mulf": (1.0, 1.0),
+    "divi": (None, 1), "divc": (None, 1), "divf": (None, 1.0),
+    "shli": (None, 0), "shlc": (None, 0),
+    "shri": (None, 0), "shrc": (None, 0),
+    "bori": (0, 0), "borc": (0, 0),
+    "xori": (0, 0), "xorc": (0, 0),
+    "bandi": (-1, -1), "bandc": (255, 255)
+}
+
+constants = {
+    int: ast.IntConstantExpression,
+    str: ast.CharConstantExpression,
+    float: ast.FloatConstantExpression
+}
+
+
+def value(node, type_):
+    """Returns the value that the virtual machine would load for the constant
+    expression `node` of type `type_`, or None if it is not a constant or if
+    it does not fit its type."""
+    if not isinstance(node, constants[type_]):
+        return None
+
+    result = node.value
+    if type_ is str:
+        result = ord(result)
+    try:
+        return formats[type_].unpack(formats[type_].pack(result))[0]
+    except (error, OverflowError):
+        return None
+
+
+def constant(result, type_):
+    """Returns a new constant expression of type `type_` that evaluates to
+    `result`, or None if the virtual machine can not represent it."""
+    try:
+        formats[type_].pack(result)
+    except (error, OverflowError):
+        return None
+    if type_ is str:
+        result = chr(result)
+    return constants[type_](result, None)
+
+
+def save(changes, *nodes):
+    """Appends the current state of every node of `nodes` to the list
+    `changes`, so that `revert` may restore it."""
+    for node in nodes:
+        state = dict(node.__dict__)
+        state["children"] = list(node.children)
+        changes.append((node, state))
+
+
+def revert(changes):
+    """Restores every node saved in the list `changes` to the earliest state
+    it was saved in, and empties the list."""
+    for node, state in reversed(changes):
+        node.__dict__ = state
+    del changes[:]
+
+
+def replace(parent, old, new, changes=None):
+    """Replaces the child `old` of `parent` with `new`. If `changes` is a
+    list, the nodes are `save`d to it first."""
+    if changes is not None:
+        save(changes, parent, old, new)
+    parent.replace_child(old, new, False)
+
+    # some nodes keep references to their children once validated
+    if isinstance(parent, ast.BinaryOperator):
+        parent.first, parent.second = parent.children
+    elif isinstance(parent, ast.DiscardExpressionStatement):
+        parent.expression = parent.children[0]
+
+
+def simplify(node):
+    """Returns the expression that `node` can be replaced with, or `node`
+    itself if it can not be simplified."""
+    operation = getattr(node, "operation", ("", ))[0]
+    if not isinstance(node, ast.BinaryOperator) or \
+            operation not in operations:
+        return node
+
+    operand, result, function = operations[operation]
+    first, second = value(node.first, operand), value(node.second, operand)
+    if first is not None and second is not None:
+        try:
+            folded = constant(function(first, second), result)
+        except (ZeroDivisionError, ValueError, OverflowError):
+            folded = None
+        return folded or node
+
+    left, right = identities.get(operation, (None, None))
+    if left is not None and first == left and type(first) is type(left):
+        return node.second
+    if right is not None and second == right and type(second) is type(right):
+        return node.first
+    return node
+
+
+def fold(node, changes=None):
+    """Replaces every operation on constant expressions in the validated tree
+    `node` with its result, and removes operations that return one of their
+    operands unchanged (such as x * 1 or x << 0). Operations that fail at
+    run time, such as divisions by zero or results that do not fit their
+    type, are left alone. If `changes` is a list, the nodes are `save`d to
+    it before they are changed."""
+    for child in list(node.children):
+        fold(child, changes)
+        result = simplify(child)
+        if result is not child:
+            replace(node, child, result, changes)
@@ -0,0 +1,127 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.optimizer.folding import replace, save
+from fcc import ast
+
+from copy import deepcopy
+
+# the default size (in syntax tree nodes) of the largest function that is
+# inlined
+threshold = 32
+
+inline_calls = {
+    ast.IntFunctionCall: ast.IntInlineFunctionCall,
+    ast.CharFunctionCall: ast.CharInlineFunctionCall,
+    ast.FloatFunctionCall: ast.FloatInlineFunctionCall
+}
+
+
+def calls(node):
+    """Yields every function call in the tree `node` along with its parent,
+    excluding the ones that were already inlined. Parents are tracked here,
+    as the parser does not keep the `parent` of expressions up to date."""
+    for child in node.children:
+        if isinstance(child, ast.FunctionCall):
+            yield node, child
+        for parent, call in calls(child):
+            yield parent, call
+
+
+def size(node):
+    """Returns the number of syntax tree nodes in `node`, including the
+    bodies of inlined calls."""
+    result = 1 + sum(size(child) for child in node.children)
+    if isinstance(node, ast.InlineFunctionCall):
+        result += size(node.body)
+    return result
+
+
+def components(functions):
+    """Returns the strongly connected components of the call graph of the
+    function definitions `functions`, callees first, along with the
+    functions that may call themselves (directly or not)."""
+    callees = dict((function, function.callees()) for function in functions)
+
+    # Tarjan's algorithm
+    result, recursive = [], set()
+    index, lowlink, stack = {}, {}, []
+
+    def visit(function):
+        index[function] = lowlink[function] = len(index)
+        stack.append(function)
+        for callee in callees[function]:
+            if callee not in index:
+                visit(callee)
+                lowlink[function] = min(lowlink[function], lowlink[callee])
+            elif callee in stack:
+                lowlink[function] = min(lowlink[function], index[callee])
+
+        if lowlink[function] == index[function]:
+            component = []
+            while not component or component[-1] is not function:
+                component.append(stack.pop())
+            if len(component) > 1 or function in callees[function]:
+                recursive.update(component)
+            result.append(component)
+
+    for function in functions:
+        if function not in index:
+            visit(function)
+    return result, recursive
+
+
+def substitute(parent, old, new, changes=None):
+    """Replaces the child `old` of `parent` with `new` and moves its children
+    over. If `changes` is a list, the nodes are `save`d to it first."""
+    replace(parent, old, new, changes)
+    for child in old.children:
+        if changes is not None:
+            save(changes, child)
+        new.add_child(child)
+        child.parent = new
+
+
+def expand(call, shared):
+    """Returns a new inline call that evaluates to the same value as the
+    function call `call`, whose arguments it does not have yet. `shared`
+    maps the ids of the nodes that every copy refers to rather than copies
+    (the global block and its children) to themselves."""
+    definition = call.definition
+    memo = dict(shared)
+    del memo[id(definition)]
+    result = inline_calls[type(call)](deepcopy(definition, memo), None)
+
+    # return statements jump to the continuation instead
+    pending = [result.body]
+    while pending:
+        node = pending.pop()
+        for child in list(node.children):
+            if isinstance(child, ast.FunctionReturn):
+                substitute(node, child, ast.InlineReturn(result, None))
+            else:
+                pending.append(child)
+    return result
+
+
+def inline(root, threshold=threshold, changes=None):
+    """Replaces the calls to small functions in the validated tree `root`
+    with copies of their bodies. Functions are small if they have at most
+    `threshold` nodes once their own calls are inlined; functions that may
+    call themselves are never inlined. If `changes` is a list, the nodes
+    are `save`d to it before they are changed."""
+    functions = [child for child in root.children
+                 if isinstance(child, ast.FunctionDefinition)]
+    shared = dict((id(child), child) for child in root.children)
+    shared[id(root)] = root
+
+    order, recursive = components(functions)
+    small = set()
+    for component in order:
+        for function in component:
+            # inner calls first, so that their parents are still in the tree
+            for parent, call in reversed(list(calls(function))):
+                if call.definition in small and type(call) in inline_calls:
+                    substitute(parent, call, expand(call, shared), changes)
+            if function not in recursive and size(function) <= threshold:
+                small.add(function)
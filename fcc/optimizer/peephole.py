@@ -0,0 +1,185 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+# number of bytes pushed by the instructions that only copy a value onto the
+# stack; pushing a value that is released right away has no effect
+sizes = {
+    "loadi": 4, "loadf": 4, "loadc": 1,
+    "pushi": 4, "pushf": 4, "pushc": 1
+}
+
+# instructions that move the stack pointer by their operand
+adjustments = {"alloc": 1, "release": -1}
+
+# jumps (including calls) and whether their target is relative to the
+# instruction itself
+jumps = {
+    "jmp": False, "jmp0": False, "jmp1": False, "call": False,
+    "jmpr": True, "jmp0r": True, "jmp1r": True,
+    "jeqi": True, "jeqf": True, "jeqc": True,
+    "jnei": True, "jnef": True, "jnec": True,
+    "jgti": True, "jgtf": True, "jgtc": True,
+    "jgei": True, "jgef": True, "jgec": True,
+    "jlti": True, "jltf": True, "jltc": True,
+    "jlei": True, "jlef": True, "jlec": True
+}
+
+# instructions after which execution never continues with the next one
+ends = {"jmp", "jmpr", "ret"}
+
+
+def targets(code, symbols):
+    """Returns the indices of every instruction that execution may continue
+    from other than by falling through from the previous one."""
+    result = set()
+    for index, operation in enumerate(code):
+        name = operation[0]
+        if name in jumps and not isinstance(operation[1], (str, unicode)):
+            if jumps[name]:
+                result.add(index + operation[1] + 1)
+            else:
+                result.add(operation[1])
+
+    for address in symbols.values():
+        if isinstance(address, (int, long)):
+            result.add(address)
+    return result
+
+
+def reachable(code, symbols):
+    """Returns the indices of the instructions of `code` that may be
+    executed when starting from its first instruction or from any integer
+    address in `symbols`, or None if any instruction may be: `popip` jumps
+    to an address that is only known at run time."""
+    if any(operation[0] == "popip" for operation in code):
+        return None
+
+    result = set()
+    pending = [0] + [address for address in symbols.values()
+                     if isinstance(address, (int, long))]
+    while pending:
+        index = pending.pop()
+        if index in result or not 0 <= index < len(code):
+            continue
+        result.add(index)
+
+        operation = code[index]
+        name = operation[0]
+        if name in jumps:
+            target = operation[1]
+            if isinstance(target, (str, unicode)):
+                target = symbols.get(target)
+            elif jumps[name]:
+                target += index + 1
+            if isinstance(target, (int, long)):
+                pending.append(target)
+        if name not in ends:
+            pending.append(index + 1)
+    return result
+
+
+def merge(previous, operation):
+    """Returns the instructions that have the same effect as `previous`
+    followed by `operation`, or None if they can not be merged."""
+    if operation[0] not in adjustments:
+        return None
+    delta = operation[1] * adjustments[operation[0]]
+
+    if previous[0] in adjustments:
+        delta += previous[1] * adjustments[previous[0]]
+    elif previous[0] in sizes and delta <= -sizes[previous[0]]:
+        # the pushed value is released right away
+        delta += sizes[previous[0]]
+    else:
+        return None
+
+    if delta > 0:
+        return [("alloc", delta)]
+    if delta < 0:
+        return [("release", -delta)]
+    return []
+
+
+def optimize(code, symbols=None):
+    """Returns a shorter version of the list of (`instruction`, `arg1`, ...)
+    tuples `code`. Values that are pushed and then released right away are
+    never pushed, consecutive `alloc` and `release` instructions are merged
+    and `nop`s are dropped. Assigning a variable in a discarded expression
+    (`popi X; pushi X; release 4`) thus becomes a plain store. Instructions
+    that can not be reached, such as the ones that follow a `ret`, are
+    dropped as well, along with the jumps that only skip them.
+
+    Jump offsets and addresses are updated to match. `symbols` maps names to
+    addresses: integer values are taken to be instruction indices and are
+    updated in place.
+    Symbolic operands (names of `symbols`) are left alone, so `code` may be
+    either linked or not."""
+    symbols = {} if symbols is None else symbols
+    labels = targets(code, symbols)
+    live = reachable(code, symbols)
+    if live is None:
+        live = set(range(len(code)))
+
+    # whether every instruction is kept, and the index of the first kept
+    # instruction at or after every index; jumps to the instruction that
+    # would run next anyway are dropped
+    kept = [index in live and operation[0] != "nop"
+            for index, operation in enumerate(code)]
+    following = [len(code)] * (len(code) + 1)
+    for index in reversed(range(len(code))):
+        operation = code[index]
+        if kept[index] and operation[0] in ("jmp", "jmpr") and \
+                not isinstance(operation[1], (str, unicode)):
+            target = operation[1]
+            if jumps[operation[0]]:
+                target += index + 1
+            if index < target <= len(code) and \
+                    following[target] == following[index + 1]:
+                kept[index] = False
+        following[index] = index if kept[index] else following[index + 1]
+
+    result = []
+
+    # index in `result` of every instruction of `code`, and of its end
+    moved = []
+    fence = 0
+    for index, operation in enumerate(code):
+        moved.append(len(result))
+        if index in labels:
+            # jumps may land here, so the instruction may not be merged into
+            # the previous one
+            fence = len(result)
+        if not kept[index]:
+            continue
+
+        pending = [operation]
+        while pending:
+            operation = pending.pop()
+            merged = None
+            if result and fence < len(result):
+                merged = merge(result[-1], operation)
+            if merged is None:
+                result.append(operation)
+            else:
+                result.pop()
+                pending.extend(merged)
+    moved.append(len(result))
+
+    # update jump targets
+    for index, operation in enumerate(code):
+        name = operation[0]
+        if name in jumps and kept[index] and \
+                not isinstance(operation[1], (str, unicode)):
+            position = moved[index]
+            if jumps[name]:
+                target = moved[index + operation[1] + 1] - position - 1
+            else:
+                target = moved[operation[1]]
+            result[position] = (name, target) + operation[2:]
+
+    # update symbols
+    for name, address in symbols.items():
+        if isinstance(address, (int, long)):
+            symbols[name] = moved[address]
+
+    return result
@@ -1,8 +1,9 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
-from fcc.parser.statements import block
-from fcc.parser.base import split_statements
+from fcc.parser.statements import statement
+from fcc.parser.scope import Scope
+from fcc.tokens import TokenStream
 from fcc import ast
 
 
@@ -11,6 +12,17 @@ class FullCircleParser(object):
         self.tokens = tokens
 
     def parse(self):
+        """Parses the tokens in a single pass and returns the `GlobalBlock`
+        of the program. Tokens may be given as a `TokenStream` or as any
+        iterable of `Token` objects."""
+        tokens = self.tokens
+        if not isinstance(tokens, TokenStream):
+            tokens = TokenStream()
+            tokens.extend(self.tokens)
+
         self.root = ast.GlobalBlock(None)
-        block(split_statements(self.tokens), self.root)
+        scope = Scope(self.root)
+        index = 0
+        while index < len(tokens):
+            index = statement(tokens, index, self.root, scope)
         return self.root
@@ -1,244 +1,258 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
-from fcc.parser.base import startswith, ParserError
+from fcc.parser.base import kinds, table, ParserError, ENDINGS
 from fcc import tokens
 from fcc import ast
 
-from operator import lt, le
-from sys import maxint
+IDENTIFIER = tokens.Identifier.kind
+OPEN = tokens.OpenParanthesisOperator.kind
+CLOSE = tokens.CloseParanthesisOperator.kind
+COMMA = tokens.CommaOperator.kind
+INCREMENT = tokens.IncrementOperator.kind
+BACKTICK = tokens.FullCircleBacktickOperator.kind
+
+OPERATORS = kinds(tokens.Operator)
+BINARY = kinds(tokens.BinaryOperator)
+UNARY = kinds(tokens.UnaryOperator)
+ASSIGNMENTS = kinds(tokens.AssignmentOperator)
+CONSTANTS = kinds(tokens.Constant)
+
+# precedence of every binary operator, from the loosest binding to the
+# tightest; assignments are right associative and every other operator is
+# left associative
+precedences = table([
+    (tokens.CommaOperator, 0),
+    # assignment
+    (tokens.AssignmentOperator, 2),
+    # bitwise and logic
+    (tokens.LogicalDisjunctionOperator, 3),
+    (tokens.LogicalConjunctionOperator, 4),
+    (tokens.BitwiseDisjunctionOperator, 5),
+    (tokens.ExclusiveDisjunctionOperator, 6),
+    (tokens.BitwiseConjunctionOperator, 7),
+    ((tokens.EqualityOperator,
+      tokens.InequalityOperator), 8),
+    # comparison
+    ((tokens.GreaterThanOperator,
+      tokens.GreaterThanOrEqualOperator,
+      tokens.LessThanOperator,
+      tokens.LessThanOrEqualOperator), 9),
+    # math
+    ((tokens.LeftShiftOperator,
+      tokens.RightShiftOperator), 10),
+    ((tokens.AdditionOperator,
+      tokens.SubstractionOperator), 11),
+    ((tokens.MultiplicationOperator,
+      tokens.DivisionOperator,
+      tokens.ModulusOperator), 12)
+])
+ASSIGNMENT = precedences[tokens.AssignmentOperator.kind]
+
+# the backtick applies to everything that follows it up to the next comma
+# (assignments included), while the other unary operators only apply to the
+# operand that immediately follows them
+BACKTICK_OPERAND = 1
+
+# the basic operator that every compound assignment operator applies
+compound_operators = table([
+    (getattr(tokens, name + "AssignmentOperator"),
+     getattr(tokens, name + "Operator"))
+    for name in ["Addition", "Substraction", "Multiplication", "Division",
+                 "Modulus", "BitwiseConjunction", "BitwiseDisjunction",
+                 "ExclusiveDisjunction", "LeftShift", "RightShift"]])
+
+binary_promotions = table([
+    (tokens.AdditionOperator, (ast.CharAddition,
+                               ast.IntAddition,
+                               ast.FloatAddition)),
+    (tokens.SubstractionOperator, (ast.CharSubstraction,
+                                   ast.IntSubstraction,
+                                   ast.FloatSubstraction)),
+    (tokens.MultiplicationOperator, (ast.CharMultiplication,
+                                     ast.IntMultiplication,
+                                     ast.FloatMultiplication)),
+    (tokens.DivisionOperator, (ast.CharDivision,
+                               ast.IntDivision,
+                               ast.FloatDivision)),
+    (tokens.ModulusOperator, (ast.CharModulus,
+                              ast.IntModulus)),
+    (tokens.BitwiseConjunctionOperator, (ast.CharBitwiseConjunction,
+                                         ast.IntBitwiseConjunction)),
+    (tokens.BitwiseDisjunctionOperator, (ast.CharBitwiseDisjunction,
+                                         ast.IntBitwiseDisjunction)),
+    (tokens.ExclusiveDisjunctionOperator, (ast.CharExclusiveDisjunction,
+                                           ast.IntExclusiveDisjunction)),
+    (tokens.LeftShiftOperator, (ast.CharLeftShift,
+                                ast.IntLeftShift)),
+    (tokens.RightShiftOperator, (ast.CharRightShift,
+                                 ast.IntRightShift)),
+    (tokens.EqualityOperator, (ast.CharEqualityComparison,
+                               ast.IntEqualityComparison,
+                               ast.FloatEqualityComparison)),
+    (tokens.InequalityOperator, (ast.CharInequalityComparison,
+                                 ast.IntInequalityComparison,
+                                 ast.FloatInequalityComparison)),
+    (tokens.GreaterThanOperator, (ast.CharGreaterThanComparison,
+                                  ast.IntGreaterThanComparison,
+                                  ast.FloatGreaterThanComparison)),
+    (tokens.GreaterThanOrEqualOperator, (
+        ast.CharGreaterThanOrEqualComparison,
+        ast.IntGreaterThanOrEqualComparison,
+        ast.FloatGreaterThanOrEqualComparison)),
+    (tokens.LessThanOperator, (ast.CharLessThanComparison,
+                               ast.IntLessThanComparison,
+                               ast.FloatLessThanComparison)),
+    (tokens.LessThanOrEqualOperator, (ast.CharLessThanOrEqualComparison,
+                                      ast.IntLessThanOrEqualComparison,
+                                      ast.FloatLessThanOrEqualComparison)),
+    (tokens.LogicalConjunctionOperator, (ast.CharLogicalConjunction,
+                                         ast.IntLogicalConjunction,
+                                         ast.FloatLogicalConjunction)),
+    (tokens.LogicalDisjunctionOperator, (ast.CharLogicalDisjunction,
+                                         ast.IntLogicalDisjunction,
+                                         ast.FloatLogicalDisjunction))
+])
+
+# unary operators that apply to the expression that follows them
+unary_promotions = table([
+    (tokens.FullCircleBacktickOperator, (ast.CharBacktick,
+                                         ast.IntBacktick,
+                                         ast.FloatBacktick)),
+    (tokens.BitwiseNegationOperator, (ast.CharBitwiseNegation,
+                                      ast.IntBitwiseNegation)),
+    (tokens.LogicalNegationOperator, (ast.CharLogicalNegation,
+                                      ast.IntLogicalNegation,
+                                      ast.FloatLogicalNegation))
+])
+
+constants = table([(tokens.IntConstant, ast.IntConstantExpression),
+                   (tokens.CharConstant, ast.CharConstantExpression),
+                   (tokens.FloatConstant, ast.FloatConstantExpression)])
 
 
 def promote(operator, promotions):
     for promotion in promotions:
         if isinstance(operator.children[0], promotion.operand_type):
-            return operator.parent.replace_child(operator, promotion(None))
+            result = promotion(None)
+            operator.parent.replace_child(operator, result)
+            return result
     raise ParserError(None, "Unable to promote operator " + operator)
 
 
-def function(fragment, parent):
-    # get function reference
-    p = parent
-    while p is not None:
-        if isinstance(p, ast.GlobalBlock) and fragment[0].name in p.symbols:
-            function = p.symbols[fragment[0].name]
-            if not isinstance(function, ast.FunctionDefinition):
-                raise ParserError(fragment[0], "Function expected")
-            break
-        p = p.parent
-    else:
-        raise ParserError(fragment[0],
-                          "Undefined identifier '" + fragment[0].name + "'")
+def wrap(node, cls):
+    """Replaces `node` with a new `cls` node that has `node` as its first
+    child, and returns the new node."""
+    result = cls(None)
+    node.parent.replace_child(node, result, False)
+    result.add_child(node)
+    node.parent = result
+    return result
+
+
+def function(fragment, index, end, parent, scope):
+    # get function reference; functions are always global
+    token = fragment[index]
+    function = scope.lookup_global(token.name)
+    if function is None:
+        raise ParserError(token, "Undefined identifier '" + token.name + "'")
+    if not isinstance(function, ast.FunctionDefinition):
+        raise ParserError(token, "Function expected")
 
     for name in ("IntFunction", "FloatFunction", "CharFunction", "Function"):
         if isinstance(function, getattr(ast, name + "Definition")):
             result = getattr(ast, name + "Call")(function, parent)
             break
     else:
-        raise ParserError(fragment[0], "Unknown function type")
-
-    # add arguments
-    spec = []
-    depth = 0
-    for token in fragment[2:-1]:
-        if depth:
-            spec.append(token)
-            if isinstance(token, (tokens.FunctionApplicationOperator,
-                                  tokens.OpenParanthesisOperator)):
-                depth += 1
-            elif isinstance(token, tokens.CloseParanthesisOperator):
-                depth -= 1
+        raise ParserError(token, "Unknown function type")
+
+    # add arguments; they are separated by commas, so they may not contain
+    # comma operators themselves
+    index += 2
+    if index < end and fragment.kind(index) == CLOSE:
+        return result, index + 1
+    while True:
+        index = operators(fragment, index, end, BACKTICK_OPERAND, result,
+                          scope)[1]
+        if index < end and fragment.kind(index) == COMMA:
+            index += 1
+        elif index < end and fragment.kind(index) == CLOSE:
+            return result, index + 1
         else:
-            if isinstance(token, (tokens.FunctionApplicationOperator,
-                                  tokens.OpenParanthesisOperator)):
-                depth += 1
+            raise ParserError(fragment[min(index, end - 1)], ") expected")
 
-            if isinstance(token, tokens.CommaOperator):
-                expression(spec, result)
-                spec = []
-            else:
-                spec.append(token)
-    if spec:
-        expression(spec, result)
 
-
-def assignment(fragment, offset, parent):
+def assignment(fragment, index, end, node, parent, scope):
     # check lvalue of an assignment is a variable
-    if not isinstance(fragment[offset-1], tokens.Identifier):
-        raise ParserError(fragment[offset-1], "Variable expected")
-
-    temp = ast.BinaryOperator(parent)
-
-    variable(fragment[offset-1:offset], temp)
-
-    for operator in ["Addition", "Substraction", "Multiplication", "Division",
-                     "Modulus", "BitwiseConjunction", "BitwiseDisjunction",
-                     "ExclusiveDisjunction", "LeftShift", "RightShift"]:
-        # compound assignment operator; replace with basic operator
-        if isinstance(fragment[offset],
-                      getattr(tokens, operator + "AssignmentOperator")):
-            fragment[offset] = getattr(tokens, operator + "Operator")(
-                fragment[offset].line,
-                fragment[offset].column)
-            binary(fragment[offset-1:], offset, temp)
-            break
+    if fragment.kind(index-1) != IDENTIFIER or \
+            not isinstance(node, ast.VariableReference):
+        raise ParserError(fragment[index-1], "Variable expected")
+
+    temp = wrap(node, ast.BinaryOperator)
+
+    operator = compound_operators[fragment.kind(index)]
+    if operator is not None:
+        # compound assignment operator; a op= b is parsed as a = a op b
+        inner = ast.BinaryOperator(temp)
+        variable(fragment[index-1], inner, scope)
+        position = index
+        index = operators(fragment, index + 1, end, ASSIGNMENT, inner,
+                          scope)[1]
+        binary(operator.kind, fragment, position, inner)
     else:
         # simple assignment operator
-        expression(fragment[offset+1:], temp)
+        index = operators(fragment, index + 1, end, ASSIGNMENT, temp,
+                          scope)[1]
 
     return promote(temp, (ast.CharAssignment,
                           ast.IntAssignment,
-                          ast.FloatAssignment))
-
-
-def binary(fragment, offset, parent):
-    temp = ast.BinaryOperator(parent)
-    expression(fragment[:offset], temp)
-    expression(fragment[offset+1:], temp)
-
-    for operator, promotions in [
-        (tokens.AdditionOperator, (ast.CharAddition,
-                                   ast.IntAddition,
-                                   ast.FloatAddition)),
-        (tokens.SubstractionOperator, (ast.CharSubstraction,
-                                       ast.IntSubstraction,
-                                       ast.FloatSubstraction)),
-        (tokens.MultiplicationOperator, (ast.CharMultiplication,
-                                         ast.IntMultiplication,
-                                         ast.FloatMultiplication)),
-        (tokens.DivisionOperator, (ast.CharDivision,
-                                   ast.IntDivision,
-                                   ast.FloatDivision)),
-        (tokens.ModulusOperator, (ast.CharModulus,
-                                  ast.IntModulus)),
-        (tokens.BitwiseConjunctionOperator, (ast.CharBitwiseConjunction,
-                                             ast.IntBitwiseConjunction)),
-        (tokens.BitwiseDisjunctionOperator, (ast.CharBitwiseDisjunction,
-                                             ast.IntBitwiseDisjunction)),
-        (tokens.ExclusiveDisjunctionOperator, (ast.CharExclusiveDisjunction,
-                                               ast.IntExclusiveDisjunction)),
-        (tokens.LeftShiftOperator, (ast.CharLeftShift,
-                                    ast.IntLeftShift)),
-        (tokens.RightShiftOperator, (ast.CharRightShift,
-                                     ast.IntRightShift)),
-        (tokens.EqualityOperator, (ast.CharEqualityComparison,
-                                   ast.IntEqualityComparison,
-                                   ast.FloatEqualityComparison)),
-        (tokens.InequalityOperator, (ast.CharInequalityComparison,
-                                     ast.IntInequalityComparison,
-                                     ast.FloatInequalityComparison)),
-        (tokens.GreaterThanOperator, (ast.CharGreaterThanComparison,
-                                      ast.IntGreaterThanComparison,
-                                      ast.FloatGreaterThanComparison)),
-        (tokens.GreaterThanOrEqualOperator, (
-            ast.CharGreaterThanOrEqualComparison,
-            ast.IntGreaterThanOrEqualComparison,
-            ast.FloatGreaterThanOrEqualComparison)),
-        (tokens.LessThanOperator, (ast.CharLessThanComparison,
-                                   ast.IntLessThanComparison,
-                                   ast.FloatLessThanComparison)),
-        (tokens.LessThanOrEqualOperator, (ast.CharLessThanOrEqualComparison,
-                                          ast.IntLessThanOrEqualComparison,
-                                          ast.FloatLessThanOrEqualComparison)),
-        (tokens.LogicalConjunctionOperator, (ast.CharLogicalConjunction,
-                                             ast.IntLogicalConjunction,
-                                             ast.FloatLogicalConjunction)),
-        (tokens.LogicalDisjunctionOperator, (ast.CharLogicalDisjunction,
-                                             ast.IntLogicalDisjunction,
-                                             ast.FloatLogicalDisjunction))
-    ]:
-        if isinstance(fragment[offset], operator):
-            return promote(temp, promotions)
-    raise ParserError(fragment[offset],
-                      "Illegal arguments to " + str(fragment[offset]))
-
-
-def unary(fragment, offset, parent):
+                          ast.FloatAssignment)), index
+
+
+def binary(kind, fragment, index, temp):
+    """Types the two-operand `temp` node of a binary operator of `kind`, whose
+    token is at `index`."""
+    promotions = binary_promotions[kind]
+    if promotions is None:
+        raise ParserError(fragment[index], "Illegal arguments to " +
+                          str(fragment[index]))
+    return promote(temp, promotions)
+
+
+def unary(fragment, index, end, parent, scope):
     temp = ast.UnaryOperator(parent)
 
-    if isinstance(fragment[offset], tokens.IncrementOperator):
-        if offset > 0 and (fragment[offset-1], tokens.Identifier):
-            # var++
-            variable(fragment[offset-1:offset], temp)
-            return promote(temp, (ast.CharSuffixIncrement,
-                                  ast.IntSuffixIncrement,
-                                  ast.FloatSuffixIncrement))
-        elif offset < len(fragment) and isinstance(fragment[offset+1],
-                                                   tokens.Identifier):
+    kind = fragment.kind(index)
+    if kind == INCREMENT:
+        if index + 1 < end and fragment.kind(index+1) == IDENTIFIER:
             # ++var
-            variable(fragment[offset+1:offset+2], temp)
+            variable(fragment[index+1], temp, scope)
             return promote(temp, (ast.CharPrefixIncrement,
                                   ast.IntPrefixIncrement,
-                                  ast.FloatPrefixIncrement))
-        else:
-            raise SyntaxError(fragment[offset], "Variable expected")
-    elif isinstance(fragment[offset], tokens.FullCircleBacktickOperator):
-        # `expr
-        expression(fragment[offset+1:], temp)
-        return promote(temp, (ast.CharBacktick,
-                              ast.IntBacktick,
-                              ast.FloatBacktick))
-    elif isinstance(fragment[offset], tokens.BitwiseNegationOperator):
-        # ~expr
-        expression(fragment[offset+1:], temp)
-        return promote(temp, (ast.CharBitwiseNegation,
-                              ast.IntBitwiseNegation))
-    elif isinstance(fragment[offset], tokens.LogicalNegationOperator):
-        # !expr
-        expression(fragment[offset+1:], temp)
-        return promote(temp, (ast.CharLogicalNegation,
-                              ast.IntLogicalNegation,
-                              ast.FloatLogicalNegation))
-    else:
-        raise ParserError(fragment[offset], "Unknown operator")
-
-
-def _operator(fragment, offset, parent):
-    if isinstance(fragment[offset], tokens.FunctionApplicationOperator):
-        if not isinstance(fragment[offset-1], tokens.Identifier):
-            raise ParserError("Identifier expected")
-        # find out where the function ends
-        depth = 0
-        for end, token in fragment[offset:]:
-            if isinstance(token, (tokens.FunctionApplicationOperator,
-                                  tokens.OpenParanthesisOperator)):
-                depth += 1
-            elif isinstance(token, tokens.CloseParanthesisOperator):
-                depth -= 1
-                if depth == 0:
-                    break
+                                  ast.FloatPrefixIncrement)), index + 2
         else:
-            raise ParserError(token, ") expected")
+            raise SyntaxError(fragment[index], "Variable expected")
 
-    if isinstance(fragment[offset], tokens.BinaryOperator):
-        # split into two subexpressions at offset
-        if offset == 0:
-            raise ParserError(fragment[offset], "No left value for binary "
-                                                "operator")
-
-        if isinstance(fragment[offset], tokens.AssignmentOperator):
-            assignment(fragment, offset, parent)
-        else:
-            binary(fragment, offset, parent)
-    elif isinstance(fragment[offset], tokens.UnaryOperator):
-        unary(fragment, offset, parent)
+    promotions = unary_promotions[kind]
+    if promotions is None:
+        raise ParserError(fragment[index], "Unknown operator")
+    if kind == BACKTICK:
+        # `expr
+        index = operators(fragment, index + 1, end, BACKTICK_OPERAND,
+                          temp, scope)[1]
     else:
-        raise ParserError(fragment[offset], "Operator expected")
+        # ~expr or !expr
+        index = operand(fragment, index + 1, end, temp, scope)[1]
+    return promote(temp, promotions), index
 
 
-def variable(fragment, parent):
-    # get variable reference from parent scope
-    p = parent
-    while p is not None:
-        if isinstance(p, ast.Block) and fragment[0].name in p.symbols:
-            variable = p.symbols[fragment[0].name]
-            if not isinstance(variable, ast.VariableDefinition):
-                raise ParserError(fragment[0], "Variable expected")
-            break
-        p = p.parent
-    else:
-        raise ParserError(fragment[0],
-                          "Undefined identifier '" + fragment[0].name + "'")
+def variable(token, parent, scope):
+    # get variable reference from the innermost scope that defines it
+    variable = scope.lookup(token.name)
+    if variable is None:
+        raise ParserError(token, "Undefined identifier '" + token.name + "'")
+    if not isinstance(variable, ast.VariableDefinition):
+        raise ParserError(token, "Variable expected")
 
     # convert variable name into a reference to it's definition
     if isinstance(variable, ast.IntVariableDefinition):
@@ -249,126 +263,84 @@ def variable(fragment, parent):
         return ast.FloatVariableReference(variable, parent)
 
 
-def constant(fragment, parent):
-    if isinstance(fragment[0], tokens.IntConstant):
-        return ast.IntConstantExpression(fragment[0].value, parent)
-    elif isinstance(fragment[0], tokens.CharConstant):
-        return ast.CharConstantExpression(fragment[0].value, parent)
-    elif isinstance(fragment[0], tokens.FloatConstant):
-        return ast.FloatConstantExpression(fragment[0].value, parent)
-    raise ParserError(fragment[0], "Unsupported constant type")
-
-
-def expression(fragment, parent):
-    min = maxint
-    min_id = -1
-    offset = 0
-
-    prev = None
-
-    for index, token in enumerate(fragment):
-        # get the operator with the lowest precedence
-        if isinstance(token, tokens.Operator):
-            if isinstance(token, (tokens.FunctionApplicationOperator)):
-                offset += 1
-            if isinstance(token, (tokens.OpenParanthesisOperator)):
-                offset += 1
-                if isinstance(prev, tokens.Identifier):
-                    fragment[index] = tokens.FunctionApplicationOperator(
-                        token.line, token.column)
-                    token = fragment[index]
-                else:
-                    prev = token
-                    continue
-            elif isinstance(token, (tokens.CloseParanthesisOperator)):
-                if offset <= 0:
-                    raise ParserError(token, "Unexpected )")
-                offset -= 1
-                prev = token
-                continue
-
-            for precedence, (operator, comparator) in enumerate([
-                (tokens.CommaOperator, le),
-                (tokens.FullCircleBacktickOperator, lt),
-                # assignment
-                (tokens.AssignmentOperator, lt),
-                # bitwise and logic
-                (tokens.LogicalDisjunctionOperator, le),
-                (tokens.LogicalConjunctionOperator, le),
-                (tokens.BitwiseDisjunctionOperator, le),
-                (tokens.ExclusiveDisjunctionOperator, le),
-                (tokens.BitwiseConjunctionOperator, le),
-                ((tokens.EqualityOperator,
-                  tokens.InequalityOperator), le),
-                # comparison
-                ((tokens.GreaterThanOperator,
-                  tokens.GreaterThanOrEqualOperator,
-                  tokens.LessThanOperator,
-                  tokens.LessThanOrEqualOperator), le),
-                # math
-                ((tokens.LeftShiftOperator,
-                  tokens.RightShiftOperator), le),
-                ((tokens.AdditionOperator,
-                  tokens.SubstractionOperator), le),
-                ((tokens.MultiplicationOperator,
-                  tokens.DivisionOperator,
-                  tokens.ModulusOperator), le),
-                # unary operators
-                (tokens.UnaryOperator, lt),
-                (tokens.FunctionApplicationOperator, le)
-            ]):
-                if isinstance(token, operator):
-                    precedence += 1000 * offset
-                    if comparator(precedence, min):
-                        min = precedence
-                        min_id = index
-                    break
-            else:
-                raise ParserError(token,
-                                  "Illegal / unsupported token: " + str(token))
-        prev = token
-
-    if offset > 0:
-        raise ParserError(fragment[-1], ") expected")
-    if min_id == -1:
-        # no operators found; expression must be either an identifier, a
-        # constant, or a call to a function without arguments
-
-        if len(fragment) == 1:
-            # constant or variable
-            if isinstance(fragment[0], tokens.Identifier):
-                return variable(fragment, parent)
-            elif isinstance(fragment[0], tokens.Constant):
-                return constant(fragment, parent)
-            else:
-                raise ParserError(fragment[0],
-                                  "Identifier or constant expected")
-        elif len(fragment) == 3:
-            if startswith(fragment, (tokens.Identifier,
-                                     tokens.OpenParanthesisOperator,
-                                     tokens.CloseParanthesisOperator)):
-                # argument-less function call
-                return function(fragment, parent)
-            elif isinstance(fragment[0], tokens.OpenParanthesisOperator) and \
-                    isinstance(fragment[-1], tokens.CloseParanthesisOperator):
-                # constant or variable wrapped in paranthesis
-                return expression(fragment[1:-1], parent)
-            else:
-                raise ParserError(fragment[0], "Invalid syntax")
-        else:
-            raise ParserError(fragment[0], "Operator expected")
-    elif min < 1000:
-        # if the lowest precedence operator is less than 1000, split the
-        # expression into two subexpressions at said operator
-        return _operator(fragment, min_id, parent)
-    else:
-        if startswith(fragment, (tokens.Identifier,
-                                 tokens.FunctionApplicationOperator)):
-            # the fragment is a function call
-            return function(fragment, parent)
-        elif isinstance(fragment[0], tokens.OpenParanthesisOperator) and \
-                isinstance(fragment[-1], tokens.CloseParanthesisOperator):
-            # the fragment is wrapped in paranthesis
-            return expression(fragment[1:-1], parent)
+def constant(token, parent):
+    result = constants[token.kind]
+    if result is None:
+        raise ParserError(token, "Unsupported constant type")
+    return result(token.value, parent)
+
+
+def operand(fragment, index, end, parent, scope):
+    """Parses the operand that begins at `index`: a constant, a variable, a
+    function call, an expression wrapped in paranthesis or a unary operator
+    applied to an operand. Returns the (`node`, `index`) of the operand and
+    of the token that follows it."""
+    if index >= end or fragment.kind(index) in ENDINGS:
+        raise ParserError(fragment[index-1] if index else None,
+                          "Expression expected")
+
+    kind = fragment.kind(index)
+    if kind == IDENTIFIER:
+        if index + 1 < end and fragment.kind(index+1) == OPEN:
+            return function(fragment, index, end, parent, scope)
+
+        node = variable(fragment[index], parent, scope)
+        if index + 1 < end and fragment.kind(index+1) == INCREMENT:
+            # var++
+            temp = wrap(node, ast.UnaryOperator)
+            return promote(temp, (ast.CharSuffixIncrement,
+                                  ast.IntSuffixIncrement,
+                                  ast.FloatSuffixIncrement)), index + 2
+        return node, index + 1
+    elif kind in CONSTANTS:
+        return constant(fragment[index], parent), index + 1
+    elif kind == OPEN:
+        node, index = operators(fragment, index + 1, end, 0, parent,
+                                scope)
+        if index >= end or fragment.kind(index) != CLOSE:
+            raise ParserError(fragment[min(index, end - 1)], ") expected")
+        return node, index + 1
+    elif kind in UNARY:
+        return unary(fragment, index, end, parent, scope)
+
+    token = fragment[index]
+    if kind in BINARY:
+        raise ParserError(token, "No left value for binary operator")
+    elif kind == CLOSE:
+        raise ParserError(token, "Unexpected )")
+    elif kind in OPERATORS:
+        raise ParserError(token, "Illegal / unsupported token: " + str(token))
+    raise ParserError(token, "Identifier or constant expected")
+
+
+def operators(fragment, index, end, minimum, parent, scope):
+    """Parses the longest expression that begins at `index` and only contains
+    binary operators whose precedence is at least `minimum` (outside of
+    paranthesis). Returns the (`node`, `index`) of the expression and of the
+    token that follows it."""
+    node, index = operand(fragment, index, end, parent, scope)
+    while index < end:
+        kind = fragment.kind(index)
+        precedence = precedences[kind]
+        if precedence is None or precedence < minimum:
+            break
+
+        if kind in ASSIGNMENTS:
+            node, index = assignment(fragment, index, end, node, parent,
+                                     scope)
         else:
-            raise ParserError(fragment[0], "Invalid syntax")
+            temp = wrap(node, ast.BinaryOperator)
+            position = index
+            index = operators(fragment, index + 1, end, precedence + 1,
+                              temp, scope)[1]
+            node = binary(kind, fragment, position, temp)
+    return node, index
+
+
+def expression(fragment, index, parent, scope, minimum=0):
+    """Parses the expression that begins at `index` and adds it to `parent`.
+    The expression ends right before the first token that can not continue
+    it, or before the first binary operator whose precedence is lower than
+    `minimum`; returns the index of that token."""
+    return operators(fragment, index, len(fragment), minimum, parent,
+                     scope)[1]
@@ -0,0 +1,47 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+
+class Scope(object):
+    """The symbols that are visible at the current point of the parse. Every
+    name maps to the stack of its visible definitions, the innermost one
+    last, so that looking up a name takes constant time no matter how deeply
+    blocks are nested. Entering a block pushes a new level and leaving it
+    pops the definitions it added, which uncovers the ones they shadowed.
+
+    Definitions are still added to their `Block` by the syntax tree, which
+    rejects duplicates; the parser must then `add` them here as well."""
+    def __init__(self, root):
+        self.root = root
+        self.definitions = {}
+        self.levels = []
+        self.push(root)
+
+    def push(self, block):
+        """Enters `block`, making the symbols it already defines visible."""
+        self.levels.append([])
+        for name, definition in block.symbols.items():
+            self.add(name, definition)
+
+    def pop(self):
+        """Leaves the innermost block."""
+        for name in self.levels.pop():
+            stack = self.definitions[name]
+            stack.pop()
+            if not stack:
+                del self.definitions[name]
+
+    def add(self, name, definition):
+        """Makes `definition` visible as `name` until the innermost block is
+        left."""
+        self.definitions.setdefault(name, []).append(definition)
+        self.levels[-1].append(name)
+
+    def lookup(self, name):
+        """Returns the innermost visible definition of `name`, or None."""
+        stack = self.definitions.get(name)
+        return stack[-1] if stack else None
+
+    def lookup_global(self, name):
+        """Returns the definition of `name` in the global block, or None."""
+        return self.root.symbols.get(name)
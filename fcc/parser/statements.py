@@ -1,183 +1,262 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
-from fcc.parser.expressions import expression, promote
-from fcc.parser.base import split, var_type, func_type, ParserError
+from fcc.parser.expressions import expression, operand, promote
+from fcc.parser.base import kinds, var_type, func_type, ParserError, \
+    DECLARATIONS, ENDINGS
 from fcc import tokens
 from fcc import ast
 
+IDENTIFIER = tokens.Identifier.kind
+OPEN = tokens.OpenParanthesisOperator.kind
+CLOSE = tokens.CloseParanthesisOperator.kind
+COMMA = tokens.CommaOperator.kind
+SEMICOLON = tokens.SemicolonToken.kind
+BLOCK_START = tokens.BlockStartToken.kind
+BLOCK_END = tokens.BlockEndToken.kind
+IF = tokens.IfKeyword.kind
+ELSE = tokens.ElseKeyword.kind
+FOR = tokens.ForKeyword.kind
+WHILE = tokens.WhileKeyword.kind
+RETURN = tokens.ReturnKeyword.kind
+VOID = tokens.VoidKeyword.kind
+
+ASSIGNMENTS = kinds(tokens.AssignmentOperator)
+
+# tokens that may not appear inside of a simple statement; finding one means
+# that the statement is missing its ;
+SEPARATORS = kinds(tokens.BlockStartToken, tokens.BlockEndToken,
+                   tokens.IfKeyword, tokens.ForKeyword, tokens.WhileKeyword,
+                   tokens.DoKeyword, tokens.ElseKeyword)
+
+# the (precedence) level of the expressions that initialize variables or are
+# passed as arguments; comma operators separate them instead
+ARGUMENT = 1
 
-def function(header, body, parent):
-    if not isinstance(parent, ast.GlobalBlock):
-        raise ParserError("Functions must be defined globally")
 
-    constructor = func_type(header[0])
+def end(fragment, index, terminator=SEMICOLON):
+    """Checks that the simple statement that ends before `index` is followed
+    by `terminator` and returns the index of the token that follows it."""
+    if index >= len(fragment):
+        raise ParserError(fragment[-1], "Unexpected end of file")
 
-    if not isinstance(header[-1], tokens.CloseParanthesisOperator):
-        raise ParserError(header[-1], ") expected")
+    kind = fragment.kind(index)
+    if kind == terminator:
+        return index + 1
+    if kind in SEPARATORS:
+        raise ParserError(fragment[index-1],
+                          "Expected ; before " + str(fragment[index]))
+    if kind == CLOSE:
+        raise ParserError(fragment[index], "Unexpected )")
+    raise ParserError(fragment[index], "Operator expected")
 
-    function = constructor(header[1].name, parent)
+
+def function(fragment, index, parent, scope):
+    if not isinstance(parent, ast.GlobalBlock):
+        raise ParserError(fragment[index],
+                          "Functions must be defined globally")
+
+    header = fragment[index]
+    name = fragment[index+1]
+    function = func_type(header)(name.name, parent)
+    scope.add(name.name, function)
 
     # add arguments if any
-    for spec in split(header[3:-1], tokens.CommaOperator):
-        if len(spec) != 2:
-            raise ParserError(spec[0], "Invalid syntax")
-        if not isinstance(spec[1], tokens.Identifier):
-            raise ParserError(spec[1], "Identifier expected")
-        function.add_argument(spec[1].name, var_type(spec[0]))
-
-    if header[1].name == "main":
-        if not isinstance(header[0], tokens.VoidKeyword):
-            raise ParserError(header[0], "'main' function must be void")
+    index += 3
+    if index < len(fragment) and fragment.kind(index) == CLOSE:
+        index += 1
+    else:
+        while True:
+            if index + 2 >= len(fragment):
+                raise ParserError(fragment[-1], "Unexpected end of file")
+            spec = fragment[index]
+            if spec.kind in (COMMA, CLOSE) or \
+                    fragment.kind(index+1) in (COMMA, CLOSE) or \
+                    fragment.kind(index+2) not in (COMMA, CLOSE):
+                raise ParserError(spec, "Invalid syntax")
+            if fragment.kind(index+1) != IDENTIFIER:
+                raise ParserError(fragment[index+1], "Identifier expected")
+            function.add_argument(fragment[index+1].name, var_type(spec))
+
+            index += 3
+            if fragment.kind(index-1) == CLOSE:
+                break
+
+    if name.name == "main":
+        if header.kind != VOID:
+            raise ParserError(header, "'main' function must be void")
         if function.arguments:
-            raise ParserError(header[3], "'main' function may not have"
-                                         "arguments")
+            raise ParserError(fragment[index-1], "'main' function may not "
+                                                 "have arguments")
 
-    block(body, function)
+    if index >= len(fragment):
+        raise ParserError(fragment[-1], "Unexpected end of file")
+    if fragment.kind(index) != BLOCK_START:
+        raise ParserError(fragment[index], "Block expected")
+    return nested(fragment, index, function, scope)
 
 
-def variable(statement, parent):
-    constructor = var_type(statement[0])
+def variable(fragment, index, parent, scope, terminator=SEMICOLON):
+    constructor = var_type(fragment[index])
 
-    # split the statement at comma boundary
-    for spec in split(statement[1:], tokens.CommaOperator):
-        if not spec or not isinstance(spec[0], tokens.Identifier):
-            raise ParserError(spec[0], "Identifier expected")
+    while True:
+        index += 1
+        if index >= len(fragment) or fragment.kind(index) != IDENTIFIER:
+            raise ParserError(fragment[min(index, len(fragment) - 1)],
+                              "Identifier expected")
 
         # assume variable is uninitialized by default
-        variable = constructor(spec[0].name, parent)
+        variable = constructor(fragment[index].name, parent)
+        scope.add(variable.name, variable)
 
-        if len(spec) > 1:
+        index += 1
+        if index < len(fragment) and fragment.kind(index) in ASSIGNMENTS:
             # variable contains initialization code
-            if not isinstance(spec[1], tokens.AssignmentOperator):
-                raise ParserError(spec[1], "= or , expected")
-            if len(spec) < 2:
-                raise ParserError(spec[2], "Expression expected")
-
-            expression(spec[2:], variable)
-
-
-def _return(fragment, parent):
-    node = ast.FunctionReturn(parent)
-    if fragment:
-        expression(fragment, node)
-
-
-def block(fragment, parent):
-    skip = 0
-    for index, statement in enumerate(fragment):
-        if not statement:
-            continue  # skip empty statements
-
-        if skip:
-            skip -= 1
-            continue  # skip already processed statements
-
-        if isinstance(statement[0], (tokens.IntKeyword,
-                                     tokens.CharKeyword,
-                                     tokens.FloatKeyword,
-                                     tokens.VoidKeyword)):
-            # declaration
-            if len(statement) < 2:
-                raise ParserError(statement[0], "Identifier expected")
-            if not isinstance(statement[1], tokens.Identifier):
-                raise ParserError(statement[1], "Identifier expected")
-
-            if \
-                    len(statement) > 2 and \
-                    isinstance(statement[2], tokens.OpenParanthesisOperator):
-                try:
-                    if not isinstance(fragment[index+1][0], list):
-                        raise ParserError(fragment[index+1], "Block expected")
-                except IndexError:
-                    raise ParserError(fragment[-1], "Unexpected end of file")
-
-                function(statement, fragment[index+1], parent)
-                skip = 1
-            else:
-                variable(statement, parent)
-        elif isinstance(statement[0], tokens.IfKeyword):
-            # conditional statement
-            result = ast.IfStatement(parent)
-            expression(statement[1:], result)
-
-            # get condition statement
-            try:
-                child = ast.Block(result)
-                if fragment[index+1] and \
-                        isinstance(fragment[index+1][0], list):
-                    block(fragment[index+1], child)
-                else:
-                    block([fragment[index+1]], child)
-                skip = 1
-            except IndexError:
-                raise ParserError(fragment[-1], "Statement expected")
-
-            # check for non-trivial else keyword
-            if index + 2 < len(fragment) and fragment[index+2] and \
-                    isinstance(fragment[index+2][0], tokens.ElseKeyword):
-                try:
-                    if fragment[index+3]:
-                        child = ast.Block(result)
-                        if isinstance(fragment[index+3][0], list):
-                            block(fragment[index+3], child)
-                        else:
-                            block([fragment[index+3]], child)
-                    skip = 3
-                except IndexError:
-                    raise ParserError(fragment[-1], "Statement expected")
-        elif isinstance(statement[0], tokens.ReturnKeyword):
-            _return(statement[1:], parent)
-        elif isinstance(statement[0], tokens.ForKeyword):
-            # for loops are automatically converted into while loops
-            try:
-                init, cond, step = split(statement[2:-1],
-                                         tokens.SemicolonToken)
-            except ValueError:
-                raise ParserError(fragment[-1], "Invalid syntax")
-
-            result = ast.Block(parent)
-            block([init], result)
-
-            loop = ast.WhileStatement(result)
-            expression(cond, loop)
-            inner = ast.Block(loop)
-
-            try:
-                if fragment[index+1] and \
-                        isinstance(fragment[index+1][0], list):
-                    block(fragment[index+1], inner)
-                else:
-                    block([fragment[index+1]], inner)
-                skip = 1
-            except IndexError:
-                raise ParserError(fragment[-1], "Statement expected")
-
-            block([step], inner)
-        elif isinstance(statement[0], tokens.WhileKeyword):
-            # while loops are implemented directly via the while statement
-            result = ast.WhileStatement(parent)
-            expression(statement[1:], result)
-            # get loop statement
-            try:
-                child = ast.Block(result)
-                if fragment[index+1] and \
-                        isinstance(fragment[index+1][0], list):
-                    block(fragment[index+1], child)
-                else:
-                    block([fragment[index+1]], child)
-                skip = 1
-            except IndexError:
-                raise ParserError(fragment[-1], "Statement expected")
-        elif isinstance(statement[0], list):
-            # unbound sub-block
-            child = ast.Block(parent)
-            block(statement, child)
-        else:
-            # anything else must be an expression; convert to discard statement
-            temp = ast.UnaryOperator(parent)
-            expression(statement, temp)
-
-            promote(temp, (ast.DiscardCharExpressionStatement,
-                           ast.DiscardIntExpressionStatement,
-                           ast.DiscardFloatExpressionStatement))
+            index = expression(fragment, index + 1, variable, scope,
+                               ARGUMENT)
+
+        if index < len(fragment) and fragment.kind(index) == COMMA:
+            continue
+        if index < len(fragment) and fragment.kind(index) != terminator and \
+                fragment.kind(index) not in SEPARATORS:
+            raise ParserError(fragment[index], "= or , expected")
+        return end(fragment, index, terminator)
+
+
+def declaration(fragment, index, parent, scope, terminator=SEMICOLON):
+    if index + 1 >= len(fragment) or fragment.kind(index+1) in ENDINGS:
+        raise ParserError(fragment[index], "Identifier expected")
+    if fragment.kind(index+1) != IDENTIFIER:
+        raise ParserError(fragment[index+1], "Identifier expected")
+
+    if index + 2 < len(fragment) and fragment.kind(index+2) == OPEN:
+        return function(fragment, index, parent, scope)
+    return variable(fragment, index, parent, scope, terminator)
+
+
+def discard(fragment, index, parent, scope, terminator=SEMICOLON):
+    # convert the expression to a discard statement
+    temp = ast.UnaryOperator(parent)
+    index = expression(fragment, index, temp, scope)
+    promote(temp, (ast.DiscardCharExpressionStatement,
+                   ast.DiscardIntExpressionStatement,
+                   ast.DiscardFloatExpressionStatement))
+    return end(fragment, index, terminator)
+
+
+def simple(fragment, index, parent, scope, terminator=SEMICOLON):
+    """Parses the declaration or expression statement that begins at `index`
+    (which may be empty) and ends with `terminator`."""
+    if index < len(fragment) and fragment.kind(index) == terminator:
+        return index + 1
+    if index < len(fragment) and fragment.kind(index) in DECLARATIONS:
+        return declaration(fragment, index, parent, scope, terminator)
+    return discard(fragment, index, parent, scope, terminator)
+
+
+def condition(fragment, index, parent, scope):
+    """Parses the paranthesized condition of the if / for / while construct
+    whose keyword is at `index`, and returns the index of the token that
+    follows it."""
+    if index + 1 >= len(fragment):
+        raise ParserError(fragment[-1], "Unexpected end of file")
+    if fragment.kind(index+1) != OPEN:
+        raise ParserError(fragment[index+1], "( expected")
+    return operand(fragment, index + 1, len(fragment), parent, scope)[1]
+
+
+def body(fragment, index, parent, scope):
+    """Adds the statements of the body of a construct that begins at `index`
+    to `parent`. Bodies may either be a single statement or a block, whose
+    statements are added directly."""
+    if index >= len(fragment):
+        raise ParserError(fragment[-1], "Statement expected")
+    if fragment.kind(index) == BLOCK_START:
+        return block(fragment, index + 1, parent, scope)
+    return statement(fragment, index, parent, scope)
+
+
+def nested(fragment, index, parent, scope):
+    """Parses the body that begins at `index` into the new block `parent`,
+    whose symbols are only visible from within the body."""
+    scope.push(parent)
+    index = body(fragment, index, parent, scope)
+    scope.pop()
+    return index
+
+
+def statement(fragment, index, parent, scope):
+    """Parses the statement that begins at `index`, adds it to `parent` and
+    returns the index of the token that follows it."""
+    kind = fragment.kind(index)
+    if kind == SEMICOLON:
+        # skip empty statements
+        return index + 1
+    elif kind in DECLARATIONS:
+        return declaration(fragment, index, parent, scope)
+    elif kind == IF:
+        # conditional statement
+        result = ast.IfStatement(parent)
+        index = condition(fragment, index, result, scope)
+        index = nested(fragment, index, ast.Block(result), scope)
+
+        # check for non-trivial else keyword
+        if index < len(fragment) and fragment.kind(index) == ELSE:
+            index += 1
+            if index < len(fragment) and fragment.kind(index) == SEMICOLON:
+                return index + 1
+            index = nested(fragment, index, ast.Block(result), scope)
+        return index
+    elif kind == RETURN:
+        result = ast.FunctionReturn(parent)
+        if index + 1 < len(fragment) and fragment.kind(index+1) == SEMICOLON:
+            return index + 2
+        return end(fragment, expression(fragment, index + 1, result, scope))
+    elif kind == FOR:
+        # for loops are automatically converted into while loops
+        if index + 1 >= len(fragment):
+            raise ParserError(fragment[-1], "Unexpected end of file")
+        if fragment.kind(index+1) != OPEN:
+            raise ParserError(fragment[index+1], "( expected")
+
+        result = ast.Block(parent)
+        scope.push(result)
+        index = simple(fragment, index + 2, result, scope)
+
+        loop = ast.WhileStatement(result)
+        index = end(fragment, expression(fragment, index, loop, scope))
+        inner = ast.Block(loop)
+        scope.push(inner)
+
+        # the step is parsed before the body, but is executed after it
+        index = simple(fragment, index, inner, scope, CLOSE)
+        step = inner.children[:]
+        del inner.children[:]
+        index = body(fragment, index, inner, scope)
+        inner.children.extend(step)
+
+        scope.pop()
+        scope.pop()
+        return index
+    elif kind == WHILE:
+        # while loops are implemented directly via the while statement
+        result = ast.WhileStatement(parent)
+        index = condition(fragment, index, result, scope)
+        return nested(fragment, index, ast.Block(result), scope)
+    elif kind == BLOCK_START:
+        # unbound sub-block
+        return nested(fragment, index, ast.Block(parent), scope)
+    elif kind == BLOCK_END:
+        raise ParserError(fragment[index], "Unexpected }")
+    # anything else must be an expression
+    return discard(fragment, index, parent, scope)
+
+
+def block(fragment, index, parent, scope):
+    """Parses the statements of the block whose { is right before `index` and
+    returns the index of the token that follows its }."""
+    while index < len(fragment):
+        if fragment.kind(index) == BLOCK_END:
+            return index + 1
+        index = statement(fragment, index, parent, scope)
+    raise ParserError(fragment[-1], "Unexpected end of file")
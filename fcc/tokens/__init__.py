@@ -5,3 +5,4 @@ from fcc.tokens.operators import *  # noqa
 from fcc.tokens.constants import *  # noqa
 from fcc.tokens.keywords import *  # noqa
 from fcc.tokens.base import *  # noqa
+from fcc.tokens.stream import *  # noqa
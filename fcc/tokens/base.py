@@ -1,25 +1,96 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals, division
 
+from array import array
+from bisect import bisect_right
+import re
+
+
+class LineIndex(object):
+    """Maps offsets in a source file to line and column numbers. The offset
+    at which every line begins is recorded once, when the source is fed to
+    the index (possibly in several chunks), and positions are looked up with
+    a binary search. Every '\\r' and every '\\n' starts a new line."""
+    newlines = re.compile(r"[\r\n]")
+
+    def __init__(self, data=""):
+        self.starts = array(b"l", [0])
+        self.size = 0
+        self.feed(data)
+
+    def feed(self, data):
+        """Appends `data` to the indexed source."""
+        size = self.size
+        self.starts.extend(size + match.end()
+                           for match in self.newlines.finditer(data))
+        self.size += len(data)
+
+    def position(self, offset):
+        """Returns the (`line`, `column`) of `offset`; both start at 1."""
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+
+class TokenType(type):
+    """Gives every token class an empty `__slots__` unless it defines its
+    own, so that tokens do not carry an attribute dictionary, and a unique
+    integer `kind`; `TokenType.classes[kind]` is the class itself."""
+    classes = []
+
+    def __new__(mcs, name, bases, namespace):
+        # `TokenStream` stores every kind in a single byte
+        assert len(mcs.classes) < 256, "Too many token classes"
+        namespace.setdefault("__slots__", ())
+        namespace["kind"] = len(mcs.classes)
+        cls = super(TokenType, mcs).__new__(mcs, name, bases, namespace)
+        mcs.classes.append(cls)
+        return cls
+
 
 class Token(object):
-    """The base class for every token"""
-    def __init__(self, line, column):
-        self.line = line
-        self.column = column
+    """The base class for every token. Tokens only store their `offset` in
+    the source and the `LineIndex` of that source; their line and column
+    numbers are computed when needed."""
+    __metaclass__ = TokenType
+    __slots__ = ("offset", "index")
+
+    def __init__(self, offset, index):
+        self.offset = offset
+        self.index = index
+
+    @classmethod
+    def build(cls, offset, index, value=None):
+        """Creates a token from the fields stored by `TokenStream`. `value`
+        is only used by tokens that carry one (identifiers and constants)."""
+        return cls(offset, index)
+
+    @property
+    def line(self):
+        return self.index.position(self.offset)[0]
+
+    @property
+    def column(self):
+        return self.index.position(self.offset)[1]
 
     def __repr__(self):
-        return "%s(%d, %d)" % (self.__class__.__name__, self.line, self.column)
+        return "%s(%d, %d)" % ((self.__class__.__name__, ) +
+                               self.index.position(self.offset))
 
 
 class Identifier(Token):
-    def __init__(self, name, line, column):
+    __slots__ = ("name", )
+
+    def __init__(self, name, offset, index):
         self.name = name
-        super(Identifier, self).__init__(line, column)
+        super(Identifier, self).__init__(offset, index)
+
+    @classmethod
+    def build(cls, offset, index, value=None):
+        return cls(value, offset, index)
 
     def __repr__(self):
-        return "%s(%s, %d, %d)" % (self.__class__.__name__, self.name,
-                                   self.line, self.column)
+        return "%s(%s, %d, %d)" % ((self.__class__.__name__, self.name) +
+                                   self.index.position(self.offset))
 
 
 class BlockStartToken(Token):
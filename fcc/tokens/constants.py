@@ -7,9 +7,15 @@ from fcc.tokens.base import Token
 class Constant(Token):
     """Represents a constant. The associated value may be inspected via the
     'value' attribute"""
-    def __init__(self, value, line, column):
+    __slots__ = ("value", )
+
+    def __init__(self, value, offset, index):
         self.value = value
-        super(Constant, self).__init__(line, column)
+        super(Constant, self).__init__(offset, index)
+
+    @classmethod
+    def build(cls, offset, index, value=None):
+        return cls(value, offset, index)
 
 
 class IntConstant(Constant):
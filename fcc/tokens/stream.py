@@ -0,0 +1,75 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.tokens.base import LineIndex, TokenType
+
+from array import array
+
+
+class TokenStream(object):
+    """A compact sequence of tokens, stored as parallel arrays rather than as
+    one object per token: `kinds` holds the `kind` of every token's class,
+    `offsets` its offset in the source and `values` the position of its
+    name or value in `table` (or -1 if it has none). Equal names and values
+    are only stored once.
+
+    Indexing a stream (or iterating over it) creates `Token` objects on
+    demand; use `kind`, `offset` and `value` to inspect tokens without
+    creating them."""
+    def __init__(self, index=None):
+        self.kinds = array(b"B")
+        self.offsets = array(b"I")
+        self.values = array(b"i")
+        self.table = []
+        self.interned = {}
+        self.index = index if index is not None else LineIndex()
+
+    def append(self, cls, offset, value=None):
+        """Adds a token of class `cls` located at `offset`."""
+        self.kinds.append(cls.kind)
+        self.offsets.append(offset)
+        if value is None:
+            self.values.append(-1)
+            return
+
+        # key on type as well, so that 1.0 and 1 stay distinct
+        key = (type(value), value)
+        position = self.interned.get(key)
+        if position is None:
+            position = self.interned[key] = len(self.table)
+            self.table.append(value)
+        self.values.append(position)
+
+    def extend(self, tokens):
+        """Adds every `Token` object of `tokens`, which must all have been
+        lexed from the same source."""
+        for token in tokens:
+            self.index = token.index
+            self.append(token.__class__, token.offset,
+                        getattr(token, "name", getattr(token, "value", None)))
+
+    def kind(self, position):
+        return self.kinds[position]
+
+    def offset(self, position):
+        return self.offsets[position]
+
+    def value(self, position):
+        value = self.values[position]
+        return self.table[value] if value >= 0 else None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in xrange(*position.indices(len(self)))]
+        return TokenType.classes[self.kinds[position]].build(
+            self.offsets[position], self.index, self.value(position))
+
+    def __iter__(self):
+        for position in xrange(len(self)):
+            yield self[position]
+
+    def __repr__(self):
+        return "%s(%d tokens)" % (self.__class__.__name__, len(self))
@@ -4,16 +4,69 @@ from __future__ import absolute_import, unicode_literals, division
 from fcc.vm.exceptions import (StackUnderflow, StackOverflow, DivisionByZero,
                                SegmentationFault, ProgramTerminated)
 from fcc.vm.decorators import pushes, pops
-
-from struct import pack, unpack
+from fcc.vm.bytecode import Bytecode, instructions, OPCODE_MASK
+
+from ctypes import c_float, c_int32
+from functools import partial
+from struct import Struct
+
+# precompiled stack formats; `str` denotes a char, as in `pops` and `pushes`
+formats = {
+    int: Struct(b"i"),
+    float: Struct(b"f"),
+    str: Struct(b"B")
+}
+
+# the ctypes of the 32 bit values that `views` reads in place
+scalars = {
+    int: c_int32,
+    float: c_float
+}
+
+
+def views(stack):
+    """Returns a mapping of `int` and `float` to four arrays of that type
+    over the bytearray `stack`, which start at its first four bytes. The
+    value at byte offset `n` is `views[type_][n & 3][n >> 2]`; reading it
+    does not create the tuple that `Struct.unpack_from` returns, and 32 bit
+    values are copied as integers regardless of their actual type."""
+    return dict((type_, [(scalar * ((len(stack) - start) // 4))
+                         .from_buffer(stack, start)
+                         for start in xrange(4)])
+                for type_, scalar in scalars.items())
 
 
 class FullCircleVirtualMachine(object):
     def __init__(self, code):
         """Creates a virtual machine that will execute `code`. `code` must be
-        a list of (`instruction`, `arg1`, `arg2`, ...) tuples."""
+        either a `Bytecode` object or a list of (`instruction`, `arg1`,
+        `arg2`, ...) tuples."""
         self.code = code
         self.sp = self.ip = 0
+        self.load()
+
+    def load(self):
+        """Decodes `self.code` into `self.program`, a list of zero-argument
+        callables that execute one instruction each. The handler for every
+        instruction is resolved and bound to its arguments once, so that
+        `step` and `run` do not have to look them up again."""
+        if isinstance(self.code, Bytecode):
+            # resolve every opcode's handler only once, and bind it to the
+            # operands read straight from the encoded words
+            code, words = self.code, self.code.words
+            handlers = [getattr(self, "_" + name)
+                        for name, _ in instructions]
+            self.program = []
+            for offset in code.offsets:
+                opcode = words[offset] & OPCODE_MASK
+                self.program.append(partial(
+                    handlers[opcode],
+                    *[code.operand(offset, index)
+                      for index in xrange(instructions[opcode][1])]))
+        else:
+            self.program = [partial(getattr(self, "_" + operation[0]),
+                                    *operation[1:])
+                            for operation in self.code]
 
     def run(self, stack=65536):
         """Starts executing the associated code until the instruction pointer
@@ -23,9 +76,11 @@ class FullCircleVirtualMachine(object):
         `VirtualMachineError` exception is raised."""
         self.start(stack)
         try:
-            while True:
-                self.step()
-        except ProgramTerminated:
+            program = self.program
+            limit = len(program)
+            while self.ip < limit:
+                program[self.ip]()
+                self.ip += 1
             return self.stack
         finally:
             self.stop()
@@ -34,21 +89,21 @@ class FullCircleVirtualMachine(object):
         """Like `run`, but allows step by step debugging. When the debugging
         session is over, `stop` must be called to release the stack."""
         self.stack = bytearray(stack)
+        self.views = views(self.stack)
         self.sp = self.ip = 0
 
     def stop(self):
         """Must be called when using `start` and `step` to free the stack."""
-        self.stack = None
+        self.stack = self.views = None
 
     def step(self):
         """Executes the next instruction as determined by `self.ip`. Raises a
         `ProgramTerminated` if the program  On error, raises a
         `VirtualMachineError` exception."""
-        if self.ip == len(self.code) or self.stack is None:
+        if self.ip >= len(self.program) or self.stack is None:
             raise ProgramTerminated
 
-        instruction, args = self.code[self.ip][0], self.code[self.ip][1:]
-        getattr(self, "_" + instruction)(*args)
+        self.program[self.ip]()
         self.ip += 1
 
     # internal stack manipulation; do not use externally
@@ -63,40 +118,36 @@ class FullCircleVirtualMachine(object):
             else:
                 type_ = int
 
-        if type_ == float:
-            fstring = b"f"
-            fsize = 4
-        elif type_ == int:
-            fstring = b"i"
-            fsize = 4
-        else:
-            fstring = b"B"
-            fsize = 1
-
-        self.sp += fsize
-        if self.sp > len(self.stack):
+        format_ = formats[type_]
+        sp = self.sp + format_.size
+        if sp > len(self.stack):
             raise StackOverflow
 
-        self.stack[self.sp-fsize:self.sp] = pack(fstring, value)
+        format_.pack_into(self.stack, self.sp, value)
+        self.sp = sp
 
     def pop(self, type_):
         """Pops a value of type `type` off the stack, returning it as a member
         of the requested type."""
-        if type_ == float:
-            fstring = b"f"
-            fsize = 4
-        elif type_ == int:
-            fstring = b"i"
-            fsize = 4
-        else:
-            fstring = b"B"
-            fsize = 1
-
-        self.sp -= fsize
+        self.sp -= formats[type_].size
         if self.sp < 0:
             raise StackUnderflow
 
-        return unpack(fstring, self.stack[self.sp:self.sp+fsize])[0]
+        if type_ is str:
+            return self.stack[self.sp]
+        return self.views[type_][self.sp & 3][self.sp >> 2]
+
+    def branch(self, addr, condition):
+        """Adds `addr` to the instruction pointer if `condition` is true.
+        Raises SegmentationFault if the resulting address is negative or
+        outside the program flow, whether or not the jump is taken."""
+        addr += self.ip
+
+        if addr < 0 or addr > len(self.code):
+            raise SegmentationFault
+
+        if condition:
+            self.ip = addr
 
     # instruction set; do not use externally
 
@@ -121,9 +172,12 @@ class FullCircleVirtualMachine(object):
         self.push(value)
 
     def _loadc(self, value):
-        """Allocates a byte onto the stack, and initializes it to `value`. If
-        the stack cannot be expanded, a StackOverflow exception is raised."""
-        self.push(value)
+        """Allocates a byte onto the stack, and initializes it to `value` (a
+        character or its code). If the stack cannot be expanded, a
+        StackOverflow exception is raised."""
+        if not isinstance(value, (int, long)):
+            value = ord(value)
+        self.push(value, str)
 
     def _release(self, count):
         """Releases `count` bytes from the stack by moving the stack pointer to
@@ -149,7 +203,8 @@ class FullCircleVirtualMachine(object):
         if addr < 0 or addr > self.sp - 8:
             raise SegmentationFault
 
-        self.stack[self.sp-4:self.sp] = self.stack[addr:addr+4]
+        words, target = self.views[int], self.sp - 4
+        words[target & 3][target >> 2] = words[addr & 3][addr >> 2]
     _pushf = _pushi
 
     def _pushc(self, addr):
@@ -192,7 +247,8 @@ class FullCircleVirtualMachine(object):
         if addr < 0 or addr > self.sp - 4:
             raise SegmentationFault
 
-        self.stack[addr:addr+4] = self.stack[self.sp:self.sp+4]
+        words = self.views[int]
+        words[addr & 3][addr >> 2] = words[self.sp & 3][self.sp >> 2]
     _popf = _popi
 
     def _popc(self, addr):
@@ -289,6 +345,32 @@ class FullCircleVirtualMachine(object):
         if flag == 0:
             self.ip = addr
 
+    # function calls
+    def _call(self, addr, size):
+        """Pushes the address of this instruction as the return address and
+        moves the instruction pointer to `addr`. `size` is the number of bytes
+        taken by the function's arguments, which are released when it
+        returns. Raises SegmentationFault if `addr` is negative, or outside
+        the program flow."""
+        if addr < 0 or addr > len(self.code):
+            raise SegmentationFault
+
+        self.push(self.ip)
+        self.ip = addr - 1
+
+    def _ret(self):
+        """Pops the return address pushed by `call`, releases the arguments
+        of that call and moves the instruction pointer right after it.
+        Raises SegmentationFault if the return address does not point to a
+        `call` instruction."""
+        addr = self.pop(int)
+        if not 0 <= addr < len(self.program) or \
+                self.program[addr].func != self._call:
+            raise SegmentationFault
+
+        self._release(self.program[addr].args[1])
+        self.ip = addr
+
     # output
     @pops(int)
     @pushes(int)
@@ -553,7 +635,11 @@ class FullCircleVirtualMachine(object):
     @pushes(str)
     def _eqi(self, a, b):
         return 1 if a == b else 0
-    _eqf = _eqi
+
+    @pops(float, float)
+    @pushes(str)
+    def _eqf(self, a, b):
+        return 1 if a == b else 0
 
     @pops(str, str)
     @pushes(str)
@@ -564,7 +650,11 @@ class FullCircleVirtualMachine(object):
     @pushes(str)
     def _neqi(self, a, b):
         return 1 if a != b else 0
-    _neqf = _neqi
+
+    @pops(float, float)
+    @pushes(str)
+    def _neqf(self, a, b):
+        return 1 if a != b else 0
 
     @pops(str, str)
     @pushes(str)
@@ -630,3 +720,77 @@ class FullCircleVirtualMachine(object):
     @pushes(str)
     def _ltec(self, b, a):
         return 1 if a <= b else 0
+
+    # fused comparison and branch functions; like `jmp0r` and `jmp1r`, these
+    # add their operand to the instruction pointer if the jump is taken
+    @pops(int, int)
+    def _jeqi(self, addr, b, a):
+        self.branch(addr, a == b)
+
+    @pops(float, float)
+    def _jeqf(self, addr, b, a):
+        self.branch(addr, a == b)
+
+    @pops(str, str)
+    def _jeqc(self, addr, b, a):
+        self.branch(addr, a == b)
+
+    @pops(int, int)
+    def _jnei(self, addr, b, a):
+        self.branch(addr, a != b)
+
+    @pops(float, float)
+    def _jnef(self, addr, b, a):
+        self.branch(addr, a != b)
+
+    @pops(str, str)
+    def _jnec(self, addr, b, a):
+        self.branch(addr, a != b)
+
+    @pops(int, int)
+    def _jgti(self, addr, b, a):
+        self.branch(addr, a > b)
+
+    @pops(float, float)
+    def _jgtf(self, addr, b, a):
+        self.branch(addr, a > b)
+
+    @pops(str, str)
+    def _jgtc(self, addr, b, a):
+        self.branch(addr, a > b)
+
+    @pops(int, int)
+    def _jgei(self, addr, b, a):
+        self.branch(addr, a >= b)
+
+    @pops(float, float)
+    def _jgef(self, addr, b, a):
+        self.branch(addr, a >= b)
+
+    @pops(str, str)
+    def _jgec(self, addr, b, a):
+        self.branch(addr, a >= b)
+
+    @pops(int, int)
+    def _jlti(self, addr, b, a):
+        self.branch(addr, a < b)
+
+    @pops(float, float)
+    def _jltf(self, addr, b, a):
+        self.branch(addr, a < b)
+
+    @pops(str, str)
+    def _jltc(self, addr, b, a):
+        self.branch(addr, a < b)
+
+    @pops(int, int)
+    def _jlei(self, addr, b, a):
+        self.branch(addr, a <= b)
+
+    @pops(float, float)
+    def _jlef(self, addr, b, a):
+        self.branch(addr, a <= b)
+
+    @pops(str, str)
+    def _jlec(self, addr, b, a):
+        self.branch(addr, a <= b)
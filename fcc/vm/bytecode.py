@@ -0,0 +1,304 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from array import array
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+import sys
+
+# every instruction known to the virtual machine, together with its number of
+# operands; an instruction's opcode is its index in this list, so new entries
+# must only ever be appended
+instructions = [
+    # stack management
+    ("nop", 0), ("alloc", 1), ("release", 1),
+    ("loadi", 1), ("loadf", 1), ("loadc", 1),
+    ("pushi", 1), ("pushf", 1), ("pushc", 1), ("puship", 0),
+    ("popi", 1), ("popf", 1), ("popc", 1), ("popip", 0),
+
+    # flow control
+    ("jmp", 1), ("jmpr", 1), ("jmp1", 1), ("jmp1r", 1), ("jmp0", 1),
+    ("jmp0r", 1),
+
+    # output
+    ("printi", 0), ("printf", 0), ("printc", 0),
+
+    # bitwise
+    ("bandi", 0), ("bandc", 0), ("bori", 0), ("borc", 0), ("xori", 0),
+    ("xorc", 0), ("bnoti", 0), ("bnotc", 0), ("shli", 0), ("shlc", 0),
+    ("shri", 0), ("shrc", 0),
+
+    # logical
+    ("landi", 0), ("landc", 0), ("landf", 0), ("lori", 0), ("lorc", 0),
+    ("lorf", 0), ("lnoti", 0), ("lnotc", 0), ("lnotf", 0),
+
+    # arithmetic
+    ("addi", 0), ("addc", 0), ("subi", 0), ("subc", 0), ("muli", 0),
+    ("mulc", 0), ("divi", 0), ("divc", 0), ("modi", 0), ("modc", 0),
+    ("negi", 0), ("negc", 0), ("addf", 0), ("subf", 0), ("mulf", 0),
+    ("divf", 0), ("pow", 0), ("powf", 0),
+
+    # conversion
+    ("ctoi", 0), ("ctof", 0), ("itoc", 0), ("itof", 0), ("ftoc", 0),
+    ("ftoi", 0),
+
+    # comparison
+    ("eqi", 0), ("eqf", 0), ("eqc", 0), ("neqi", 0), ("neqf", 0),
+    ("neqc", 0), ("gti", 0), ("gtf", 0), ("gtc", 0), ("gtei", 0),
+    ("gtef", 0), ("gtec", 0), ("lti", 0), ("ltf", 0), ("ltc", 0),
+    ("ltei", 0), ("ltef", 0), ("ltec", 0),
+
+    # fused comparison and relative jump
+    ("jeqi", 1), ("jeqf", 1), ("jeqc", 1), ("jnei", 1), ("jnef", 1),
+    ("jnec", 1), ("jgti", 1), ("jgtf", 1), ("jgtc", 1), ("jgei", 1),
+    ("jgef", 1), ("jgec", 1), ("jlti", 1), ("jltf", 1), ("jltc", 1),
+    ("jlei", 1), ("jlef", 1), ("jlec", 1),
+
+    # function calls
+    ("call", 2), ("ret", 0)
+]
+
+opcodes = dict((name, opcode)
+               for opcode, (name, _) in enumerate(instructions))
+
+# the low byte of an instruction word holds the opcode; bit 8 + n is set if
+# operand n is an index in the constant pool rather than an inline integer
+OPCODE_MASK = 0xff
+CONSTANT_FLAG = 0x100
+
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+# on-disk format (.fbc); all values are little endian. The header ends with
+# the program's `stack` size (-1 if it is not set) and is followed by the
+# `offsets` and `words` arrays (4 bytes per entry), the constant pool (a type
+# tag followed by the value for every constant) and the symbol table
+# (address, name length and utf-8 encoded name for every symbol).
+MAGIC = b"FCCB"
+FORMAT_VERSION = 2
+header = Struct(b"<4sHHIIIIi")
+word = Struct(b"<i")
+tags = {int: b"q", long: b"q", float: b"d", bool: b"?", bytes: b"b",
+        unicode: b"u"}
+scalars = {b"q": Struct(b"<q"), b"d": Struct(b"<d"), b"?": Struct(b"<?")}
+length = Struct(b"<I")
+symbol = Struct(b"<iH")
+
+
+class MappedArray(object):
+    """A read-only sequence of little endian 32 bit integers that are read on
+    demand from `count` entries of `buffer_` starting at `offset`."""
+    def __init__(self, buffer_, offset, count):
+        self.buffer = buffer_
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("index out of range")
+        return word.unpack_from(self.buffer, self.offset + 4 * index)[0]
+
+    def __iter__(self):
+        for index in xrange(self.count):
+            yield word.unpack_from(self.buffer, self.offset + 4 * index)[0]
+
+
+class Bytecode(object):
+    """A compact representation of a virtual machine program. Instructions are
+    stored in `words`, an `array('i')` where every instruction takes one word
+    for its opcode followed by one word for each of its operands. Operands
+    that are not 32 bit integers (such as floating point constants) are
+    stored in the `constants` pool and referenced by index. `offsets[n]` is
+    the position of the n-th instruction in `words`; jump targets remain
+    instruction indices.
+
+    `symbols` maps the name of every global symbol to its address (functions
+    to instruction indices and variables to stack addresses). `stack` is the
+    number of stack bytes that `fcc.run` gives the program by default, or
+    None if it has not been worked out yet.
+
+    A `Bytecode` object behaves like a read-only list of the (`instruction`,
+    `arg1`, `arg2`, ...) tuples it was built from. Programs that are `load`ed
+    keep their file mapped until they are closed, which `with` statements
+    do as well."""
+    def __init__(self, words, offsets, constants, symbols=None, stack=None):
+        self.words = words
+        self.offsets = offsets
+        self.constants = constants
+        self.symbols = symbols or {}
+        self.stack = stack
+
+        # the memory mapping that `words` and `offsets` are read from, if any
+        self.mapping = None
+
+    @classmethod
+    def from_tuples(cls, code, symbols=None, stack=None):
+        """Encodes a list of (`instruction`, `arg1`, `arg2`, ...) tuples."""
+        words, offsets, constants = array(b"i"), array(b"i"), []
+        pool = {}
+
+        for operation in code:
+            try:
+                opcode = opcodes[operation[0]]
+            except KeyError:
+                raise ValueError("Unknown instruction %r" % (operation[0], ))
+            assert len(operation) - 1 == instructions[opcode][1], \
+                "Invalid operand count for '%s'" % operation[0]
+
+            offsets.append(len(words))
+            words.append(opcode)
+            for index, operand in enumerate(operation[1:]):
+                if type(operand) in (int, long) and \
+                        INT_MIN <= operand <= INT_MAX:
+                    words.append(operand)
+                else:
+                    # key on type as well, so that 1.0 and 1 stay distinct
+                    key = (type(operand), operand)
+                    if key not in pool:
+                        pool[key] = len(constants)
+                        constants.append(operand)
+                    words[offsets[-1]] |= CONSTANT_FLAG << index
+                    words.append(pool[key])
+
+        return cls(words, offsets, constants, symbols, stack)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps the .fbc file at `path`. Instructions are decoded
+        directly from the mapping when they are executed."""
+        with open(path, "rb") as f:
+            data = mmap(f.fileno(), 0, access=ACCESS_READ)
+        try:
+            result = cls._decode(data)
+        except Exception:
+            data.close()
+            raise
+        result.mapping = data
+        return result
+
+    @classmethod
+    def _decode(cls, data):
+        if len(data) < header.size:
+            raise ValueError("Not an fcc bytecode file")
+        magic, version, _, count, size, constants, symbols, stack = \
+            header.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not an fcc bytecode file")
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported bytecode version %d" % version)
+
+        position = header.size
+        offsets = MappedArray(data, position, count)
+        position += 4 * count
+        words = MappedArray(data, position, size)
+        position += 4 * size
+
+        pool = []
+        for _ in xrange(constants):
+            tag = data[position]
+            position += 1
+            if tag in scalars:
+                pool.append(scalars[tag].unpack_from(data, position)[0])
+                position += scalars[tag].size
+            else:
+                end = position + length.size + \
+                    length.unpack_from(data, position)[0]
+                value = data[position + length.size:end]
+                pool.append(value.decode("utf-8") if tag == b"u" else value)
+                position = end
+
+        table = {}
+        for _ in xrange(symbols):
+            address, size = symbol.unpack_from(data, position)
+            position += symbol.size
+            table[data[position:position + size].decode("utf-8")] = address
+            position += size
+
+        return cls(words, offsets, pool, table, None if stack < 0 else stack)
+
+    def save(self, path):
+        """Writes the program to `path` in the .fbc format."""
+        with open(path, "wb") as f:
+            f.write(header.pack(MAGIC, FORMAT_VERSION, 0, len(self.offsets),
+                                len(self.words), len(self.constants),
+                                len(self.symbols),
+                                -1 if self.stack is None else self.stack))
+            for values in (self.offsets, self.words):
+                values = array(b"i", values)
+                if sys.byteorder != "little":
+                    values.byteswap()
+                f.write(values.tostring())
+
+            for value in self.constants:
+                tag = tags[type(value)]
+                f.write(tag)
+                if tag in scalars:
+                    f.write(scalars[tag].pack(value))
+                else:
+                    if tag == b"u":
+                        value = value.encode("utf-8")
+                    f.write(length.pack(len(value)) + value)
+
+            for name, address in sorted(self.symbols.items()):
+                name = name.encode("utf-8")
+                f.write(symbol.pack(address, len(name)) + name)
+
+    def close(self):
+        """Unmaps the file that the program was loaded from, after which it
+        may no longer be used. Does nothing if it was not loaded."""
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def to_tuples(self):
+        """Decodes the program back into a list of tuples."""
+        return list(self)
+
+    def decode(self):
+        """Yields an (`opcode`, `operands`) tuple for every instruction, where
+        `opcode` is the instruction's index in `instructions`."""
+        for offset in self.offsets:
+            yield self.instruction(offset)
+
+    def instruction(self, offset):
+        """Returns the (`opcode`, `operands`) tuple of the instruction that
+        starts at `offset` in `words`."""
+        opcode = self.words[offset] & OPCODE_MASK
+        return opcode, tuple(self.operand(offset, index)
+                             for index in xrange(instructions[opcode][1]))
+
+    def operand(self, offset, index):
+        """Returns operand `index` of the instruction that starts at `offset`
+        in `words`, looked up in the constant pool if it is stored there."""
+        value = self.words[offset + 1 + index]
+        if self.words[offset] & (CONSTANT_FLAG << index):
+            return self.constants[value]
+        return value
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        for opcode, operands in self.decode():
+            yield (instructions[opcode][0], ) + operands
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+
+        opcode, operands = self.instruction(self.offsets[index])
+        return (instructions[opcode][0], ) + operands
+
+    def __repr__(self):
+        return "%s(%d instructions, %d constants)" % (
+            self.__class__.__name__, len(self), len(self.constants))
@@ -0,0 +1,474 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.vm.exceptions import (StackUnderflow, StackOverflow, DivisionByZero,
+                               SegmentationFault)
+from fcc.vm import formats
+from fcc.vm.bytecode import Bytecode, instructions, OPCODE_MASK
+
+from operator import (add, sub, mul, truediv, pow, and_, or_, xor, lshift,
+                      rshift, invert, neg, not_, eq, ne, gt, ge, lt, le)
+
+
+def _divide(a, b):
+    if b == 0:
+        raise DivisionByZero
+    return a // b
+
+
+def _modulo(a, b):
+    if b == 0:
+        raise DivisionByZero
+    return a % b
+
+
+def _print(a):
+    print a
+    return a
+
+
+def _identity(a):
+    return a
+
+
+def _fault():
+    raise SegmentationFault
+
+
+# (operand type, result type, function) for every binary operation. The
+# function receives the left operand (the one pushed first) followed by the
+# right operand (the one on top of the stack).
+binary = {
+    # bitwise
+    "bandi": (int, int, and_),
+    "bandc": (str, str, and_),
+    "bori": (int, int, or_),
+    "borc": (str, str, or_),
+    "xori": (int, int, xor),
+    "xorc": (str, str, xor),
+    "shli": (int, int, lshift),
+    "shlc": (str, str, lshift),
+    "shri": (int, int, rshift),
+    "shrc": (str, str, rshift),
+
+    # logical
+    "landi": (int, int, lambda a, b: b and a),
+    "landc": (str, str, lambda a, b: b and a),
+    "landf": (float, float, lambda a, b: b and a),
+    "lori": (int, int, lambda a, b: b or a),
+    "lorc": (str, str, lambda a, b: b or a),
+    "lorf": (float, float, lambda a, b: b or a),
+
+    # arithmetic
+    "addi": (int, int, add),
+    "addc": (str, str, add),
+    "subi": (int, int, sub),
+    "subc": (str, str, sub),
+    "muli": (int, int, mul),
+    "mulc": (str, str, mul),
+    "divi": (int, int, _divide),
+    "divc": (str, str, _divide),
+    "modi": (int, int, _modulo),
+    "modc": (str, str, _modulo),
+    "addf": (float, float, add),
+    "subf": (float, float, sub),
+    "mulf": (float, float, mul),
+    "divf": (float, float, truediv),
+    "pow": (float, float, pow),
+    "powf": (float, float, pow),
+
+    # comparison
+    "eqi": (int, str, eq),
+    "eqf": (float, str, eq),
+    "eqc": (str, str, eq),
+    "neqi": (int, str, ne),
+    "neqf": (float, str, ne),
+    "neqc": (str, str, ne),
+    "gti": (int, str, gt),
+    "gtf": (float, str, gt),
+    "gtc": (str, str, gt),
+    "gtei": (int, str, ge),
+    "gtef": (float, str, ge),
+    "gtec": (str, str, ge),
+    "lti": (int, str, lt),
+    "ltf": (float, str, lt),
+    "ltc": (str, str, lt),
+    "ltei": (int, str, le),
+    "ltef": (float, str, le),
+    "ltec": (str, str, le)
+}
+
+# (operand type, function) for every fused comparison and relative jump; the
+# jump is taken if the function returns true
+branches = {
+    "jeqi": (int, eq),
+    "jeqf": (float, eq),
+    "jeqc": (str, eq),
+    "jnei": (int, ne),
+    "jnef": (float, ne),
+    "jnec": (str, ne),
+    "jgti": (int, gt),
+    "jgtf": (float, gt),
+    "jgtc": (str, gt),
+    "jgei": (int, ge),
+    "jgef": (float, ge),
+    "jgec": (str, ge),
+    "jlti": (int, lt),
+    "jltf": (float, lt),
+    "jltc": (str, lt),
+    "jlei": (int, le),
+    "jlef": (float, le),
+    "jlec": (str, le)
+}
+
+# (operand type, result type, function) for every unary operation
+unary = {
+    # output
+    "printi": (int, int, _print),
+    "printf": (float, float, _print),
+    "printc": (str, str, _print),
+
+    # bitwise and logical
+    "bnoti": (int, int, invert),
+    "bnotc": (str, str, invert),
+    "lnoti": (int, int, not_),
+    "lnotc": (str, str, not_),
+    "lnotf": (str, str, not_),
+
+    # arithmetic
+    "negi": (int, int, neg),
+    "negc": (str, str, lambda a: 256 - a),
+
+    # conversion
+    "ctoi": (str, int, _identity),
+    "ctof": (str, float, _identity),
+    "itoc": (int, str, _identity),
+    "itof": (int, float, _identity),
+    "ftoc": (float, str, _identity),
+    "ftoi": (float, int, _identity)
+}
+
+
+class FullCircleThreadedVirtualMachine(object):
+    def __init__(self, code):
+        """Creates a virtual machine that will execute `code`, which is
+        either a `Bytecode` object or a list of (`instruction`, `arg1`,
+        `arg2`, ...) tuples, like the code of `FullCircleVirtualMachine`.
+        Instead of dispatching on instruction names, every instruction is
+        compiled into a closure that has its operands baked in and returns
+        the address of the next instruction."""
+        self.code = code
+        self.sp = 0
+
+    def run(self, stack=65536):
+        """Executes the associated code until it runs past its last
+        instruction, or until an error occurs. At most `stack` bytes will be
+        available to the program (defaults to 64K). If the code terminates
+        gracefully, the stack is returned. Otherwise, a `VirtualMachineError`
+        exception is raised."""
+        self.stack = bytearray(stack)
+        self.registers = [0]
+        try:
+            program = self.load()
+            limit = len(program)
+            ip = 0
+            while ip < limit:
+                ip = program[ip]()
+            return self.stack
+        finally:
+            self.sp = self.registers[0]
+            self.stack = self.registers = None
+
+    def load(self):
+        """Returns the list of closures that execute `self.code` on the
+        current stack."""
+        # argument size of every call instruction, keyed by its address
+        self.calls = {}
+        if not isinstance(self.code, Bytecode):
+            return [self.build(index, operation[0], *operation[1:])
+                    for index, operation in enumerate(self.code)]
+
+        # read the operands straight from the encoded words
+        code, words = self.code, self.code.words
+        result = []
+        for index, offset in enumerate(code.offsets):
+            name, count = instructions[words[offset] & OPCODE_MASK]
+            result.append(self.build(index, name,
+                                     *[code.operand(offset, operand)
+                                       for operand in xrange(count)]))
+        return result
+
+    def build(self, ip, instruction, *args):
+        """Returns a closure that executes `instruction` at address `ip`."""
+        if instruction in binary:
+            return self.binary(ip + 1, *binary[instruction])
+        if instruction in unary:
+            return self.unary(ip + 1, *unary[instruction])
+        if instruction in branches:
+            target = ip + args[0] + 1 if self.valid(ip + args[0]) else None
+            return self.compare(ip + 1, target, *branches[instruction])
+        return getattr(self, "_" + instruction)(ip, *args)
+
+    def valid(self, addr):
+        """Returns whether `addr` may be jumped to."""
+        return 0 <= addr <= len(self.code)
+
+    # closure factories; do not use externally
+    def binary(self, next_, operand, result, function):
+        stack, registers, size = self.stack, self.registers, len(self.stack)
+        unpack, pack = formats[operand].unpack_from, formats[result].pack_into
+        width = formats[operand].size
+        grow = formats[result].size - 2 * width
+
+        def execute():
+            sp = registers[0] - 2 * width
+            if sp < 0:
+                raise StackUnderflow
+            if sp + 2 * width + grow > size:
+                raise StackOverflow
+            pack(stack, sp, function(unpack(stack, sp)[0],
+                                     unpack(stack, sp + width)[0]))
+            registers[0] = sp + 2 * width + grow
+            return next_
+        return execute
+
+    def unary(self, next_, operand, result, function):
+        stack, registers, size = self.stack, self.registers, len(self.stack)
+        unpack, pack = formats[operand].unpack_from, formats[result].pack_into
+        width = formats[operand].size
+        grow = formats[result].size - width
+
+        def execute():
+            sp = registers[0] - width
+            if sp < 0:
+                raise StackUnderflow
+            if sp + width + grow > size:
+                raise StackOverflow
+            pack(stack, sp, function(unpack(stack, sp)[0]))
+            registers[0] = sp + width + grow
+            return next_
+        return execute
+
+    def load_constant(self, next_, value, format_=None):
+        stack, registers, size = self.stack, self.registers, len(self.stack)
+        if format_ is None:
+            format_ = formats[float if isinstance(value, float) else int]
+        pack, width = format_.pack_into, format_.size
+
+        def execute():
+            sp = registers[0] + width
+            if sp > size:
+                raise StackOverflow
+            pack(stack, sp - width, value)
+            registers[0] = sp
+            return next_
+        return execute
+
+    def push_from(self, next_, addr, format_):
+        stack, registers, size = self.stack, self.registers, len(self.stack)
+        unpack, pack, width = format_.unpack_from, format_.pack_into, \
+            format_.size
+
+        if addr < 0:
+            def execute():
+                sp = registers[0] + width
+                if sp > size:
+                    raise StackOverflow
+                source = sp - width + addr
+                if source < 0 or addr > -width:
+                    raise SegmentationFault
+                pack(stack, sp - width, unpack(stack, source)[0])
+                registers[0] = sp
+                return next_
+        else:
+            def execute():
+                sp = registers[0] + width
+                if sp > size:
+                    raise StackOverflow
+                if addr > sp - 2 * width:
+                    raise SegmentationFault
+                pack(stack, sp - width, unpack(stack, addr)[0])
+                registers[0] = sp
+                return next_
+        return execute
+
+    def pop_to(self, next_, addr, format_):
+        stack, registers = self.stack, self.registers
+        unpack, pack, width = format_.unpack_from, format_.pack_into, \
+            format_.size
+
+        if addr < 0:
+            def execute():
+                sp = registers[0]
+                target = sp + addr
+                sp -= width
+                if sp < 0:
+                    raise StackUnderflow
+                if target < 0 or target > sp - width:
+                    raise SegmentationFault
+                pack(stack, target, unpack(stack, sp)[0])
+                registers[0] = sp
+                return next_
+        else:
+            def execute():
+                sp = registers[0] - width
+                if sp < 0:
+                    raise StackUnderflow
+                if addr > sp - width:
+                    raise SegmentationFault
+                pack(stack, addr, unpack(stack, sp)[0])
+                registers[0] = sp
+                return next_
+        return execute
+
+    def branch(self, next_, target, taken):
+        """Pops a flag and jumps to `target` if `taken(flag)` is true."""
+        stack, registers = self.stack, self.registers
+
+        def execute():
+            sp = registers[0] - 1
+            if sp < 0:
+                raise StackUnderflow
+            registers[0] = sp
+            if target is None:
+                raise SegmentationFault
+            if taken(stack[sp]):
+                return target
+            return next_
+        return execute
+
+    def compare(self, next_, target, operand, function):
+        """Pops two operands and jumps to `target` if `function(left, right)`
+        is true."""
+        stack, registers = self.stack, self.registers
+        unpack, width = formats[operand].unpack_from, formats[operand].size
+
+        def execute():
+            sp = registers[0] - 2 * width
+            if sp < 0:
+                raise StackUnderflow
+            registers[0] = sp
+            if target is None:
+                raise SegmentationFault
+            if function(unpack(stack, sp)[0], unpack(stack, sp + width)[0]):
+                return target
+            return next_
+        return execute
+
+    # instruction set; do not use externally
+
+    # stack management
+    def _alloc(self, ip, count):
+        registers, size = self.registers, len(self.stack)
+
+        def execute():
+            sp = registers[0] + count
+            if sp > size:
+                raise StackOverflow
+            registers[0] = sp
+            return ip + 1
+        return execute
+
+    def _release(self, ip, count):
+        registers = self.registers
+
+        def execute():
+            sp = registers[0] - count
+            if sp < 0:
+                raise StackUnderflow
+            registers[0] = sp
+            return ip + 1
+        return execute
+
+    def _loadi(self, ip, value):
+        return self.load_constant(ip + 1, value)
+    _loadf = _loadi
+
+    def _loadc(self, ip, value):
+        if not isinstance(value, (int, long)):
+            value = ord(value)
+        return self.load_constant(ip + 1, value, formats[str])
+
+    def _pushi(self, ip, addr):
+        return self.push_from(ip + 1, addr, formats[int])
+    _pushf = _pushi
+
+    def _pushc(self, ip, addr):
+        return self.push_from(ip + 1, addr, formats[str])
+
+    def _popi(self, ip, addr):
+        return self.pop_to(ip + 1, addr, formats[int])
+    _popf = _popi
+
+    def _popc(self, ip, addr):
+        return self.pop_to(ip + 1, addr, formats[str])
+
+    def _puship(self, ip):
+        return self.load_constant(ip + 1, ip)
+
+    def _popip(self, ip):
+        stack, registers = self.stack, self.registers
+        unpack = formats[int].unpack_from
+
+        def execute():
+            sp = registers[0] - 4
+            if sp < 0:
+                raise StackUnderflow
+            registers[0] = sp
+            return unpack(stack, sp)[0] + 1
+        return execute
+
+    # flow control
+    def _nop(self, ip):
+        return lambda: ip + 1
+
+    def _jmp(self, ip, addr):
+        if not self.valid(addr):
+            return _fault
+        return lambda: addr
+
+    def _jmpr(self, ip, addr):
+        if not self.valid(ip + addr):
+            return _fault
+        return lambda: ip + addr + 1
+
+    def _jmp1(self, ip, addr):
+        target = addr if self.valid(addr) else None
+        return self.branch(ip + 1, target, bool)
+
+    def _jmp1r(self, ip, addr):
+        target = ip + addr + 1 if self.valid(ip + addr) else None
+        return self.branch(ip + 1, target, bool)
+
+    def _jmp0(self, ip, addr):
+        target = addr if self.valid(addr) else None
+        return self.branch(ip + 1, target, not_)
+
+    def _jmp0r(self, ip, addr):
+        target = ip + addr + 1 if self.valid(ip + addr) else None
+        return self.branch(ip + 1, target, not_)
+
+    # function calls
+    def _call(self, ip, addr, size):
+        if not self.valid(addr):
+            return _fault
+        self.calls[ip] = size
+        return self.load_constant(addr, ip)
+
+    def _ret(self, ip):
+        stack, registers, calls = self.stack, self.registers, self.calls
+        unpack = formats[int].unpack_from
+
+        def execute():
+            sp = registers[0] - 4
+            if sp < 0:
+                raise StackUnderflow
+            addr = unpack(stack, sp)[0]
+            if addr not in calls:
+                raise SegmentationFault
+            sp -= calls[addr]
+            if sp < 0:
+                raise StackUnderflow
+            registers[0] = sp
+            return addr + 1
+        return execute
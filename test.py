@@ -1,3 +1,4 @@
-import fcc
+import unittest
 
-fcc.run(fcc.compile(fcc.parse(fcc.lex(open("tests/basic.c").read()))))
+# runs every test in tests/, which also compiles the programs found there
+unittest.main(module=None, argv=["test.py", "discover", "-s", "tests"])
@@ -0,0 +1,29 @@
+/* -0.0 is false and equal to 0.0, as in C */
+float negate(float value) {
+    return value * (0.0 - 1.0);
+}
+
+void main()
+{
+    float zero = 0.0, negative = negate(0.0), half = 0.5;
+
+    `negative && half;
+    `half && negative;
+    `negative || negative;
+    `negative || half;
+    `negative == zero;
+    `negative != zero;
+    if(negative || zero)
+        `1;
+    else
+        `0;
+    if(negative == zero)
+        `1;
+    else
+        `0;
+    `negate(0.0) && 1.0;
+    `negate(0.0) == 0.0;
+    `0.0 * (0.0 - 1.0) && 1.0;
+    `0.0 * (0.0 - 1.0) == 0.0;
+    `negative;
+}
@@ -0,0 +1,11 @@
+int g = 5;
+int h;
+int bump() { g = g + 1; h = g * 2; return g; }
+void main() {
+    int a = 7;
+    { int a = 3; `a; }
+    `a;
+    `bump();
+    `bump() + g;
+    `h;
+}
@@ -0,0 +1,23 @@
+int sq(int x) { return x * x; }
+int add3(int a, int b, int c) { return a + b + c; }
+float half(float f) { return f / 2.0; }
+void main() {
+    int i, j, total = 0;
+    for(i = 0; i < 10; i += 1) {
+        for(j = 0; j < i; j += 1) {
+            if(j % 2 == 0) total += sq(j);
+            else total -= j;
+        }
+    }
+    `total;
+    `add3(1, 2, 3) * 2 - 7 / 2 + (5 << 2) - (64 >> 3);
+    `half(3.0);
+    `1 < 2;
+    `(3 >= 4) || (2 != 2);
+    `(1 == 1) && (2 <= 2);
+    `~5 & 12 | 3 ^ 1;
+    `7 / 2;
+    `7 % 3;
+    int k = 100;
+    while(k > 1) { if(k % 2 == 0) k /= 2; else k = 3 * k + 1; `k; }
+}
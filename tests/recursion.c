@@ -0,0 +1,19 @@
+/* returns through a tail call, which takes no stack on the virtual machines
+   but one python frame per call on the python target */
+int count(int n) {
+    if(n == 0)
+        return 0;
+    return count(n - 1);
+}
+
+int sum(int n) {
+    if(n == 0)
+        return 0;
+    return n + sum(n - 1);
+}
+
+void main()
+{
+    `count(20000);
+    `sum(1000);
+}
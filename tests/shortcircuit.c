@@ -0,0 +1,30 @@
+int calls = 0;
+
+int touch(int value) {
+    calls += 1;
+    `value;
+    return value;
+}
+
+void main()
+{
+    /* the right operand only runs when it decides the result */
+    `0 && touch(1);
+    `1 || touch(2);
+    `1 && touch(3);
+    `0 || touch(0);
+    `calls;
+
+    if(touch(0) && touch(4))
+        `5;
+    else
+        `6;
+    while(calls < 9 || touch(0) != 0)
+        calls += 1;
+    `calls;
+
+    `'a' && 'b';
+    `0.5 && 2.0;
+    `0.0 || 0.25;
+    `0.0 && 0.25;
+}
@@ -0,0 +1,78 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+import fcc
+
+from StringIO import StringIO
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import sys
+import unittest
+
+first = "void main() { `1 + 2; }"
+second = "int twice(int a) { return a * 2; } void main() { `twice(4); }"
+
+
+def output(bytecode):
+    """Runs `bytecode` and returns what it prints."""
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        fcc.run(bytecode)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+class CompileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_key(self):
+        cache = fcc.CompileCache()
+        self.assertEqual(cache.key(first), cache.key(first.decode("utf-8")))
+        self.assertNotEqual(cache.key(first), cache.key(second))
+        self.assertNotEqual(cache.key(second),
+                            cache.key(second, inline_threshold=0))
+
+    def test_memory(self):
+        cache = fcc.CompileCache()
+        bytecode = cache.compile(first)
+        self.assertIs(cache.compile(first), bytecode)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIn(first, cache)
+        self.assertNotIn(second, cache)
+
+        # other options compile the program again
+        self.assertNotIn((first, 0), cache)
+        self.assertIsNot(cache.compile(first, inline_threshold=0), bytecode)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertIn((first, 0), cache)
+
+    def test_directory(self):
+        bytecode = fcc.CompileCache(directory=self.directory).compile(second)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        cache = fcc.CompileCache(directory=self.directory)
+        with cache.compile(second) as loaded:
+            self.assertEqual((cache.hits, cache.misses), (1, 0))
+            self.assertEqual(loaded.to_tuples(), bytecode.to_tuples())
+            self.assertEqual(loaded.stack, bytecode.stack)
+
+    def test_eviction(self):
+        # evicted programs stay usable, as callers may still hold them
+        cache = fcc.CompileCache(size=1, directory=self.directory)
+        cache.compile(first)
+        cache = fcc.CompileCache(size=1, directory=self.directory)
+        loaded = cache.compile(first)
+        cache.compile(second)
+        self.assertEqual((len(cache), cache.evictions), (1, 1))
+        self.assertNotIn(first, cache)
+        self.assertEqual(output(loaded), "3\n")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(output(loaded), "3\n")
+        loaded.close()
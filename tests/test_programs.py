@@ -0,0 +1,143 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+import fcc
+from fcc.vm.exceptions import StackOverflow
+
+from StringIO import StringIO
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import sys
+import unittest
+
+directory = os.path.dirname(os.path.abspath(__file__))
+
+# the programs of the corpus that terminate; every one of them has a .out
+# file next to it with what it prints
+programs = ["ack", "basic", "fib", "floats", "globals", "loop", "nested",
+            "recursion", "shortcircuit"]
+
+
+def source(name):
+    with open(os.path.join(directory, name + ".c")) as f:
+        return f.read()
+
+
+def expected(name):
+    with open(os.path.join(directory, name + ".out")) as f:
+        return f.read()
+
+
+def capture(function, *args, **kwargs):
+    """Calls `function` and returns what it prints."""
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        function(*args, **kwargs)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+def execute(data, engine):
+    """Returns what the program `data` prints when it runs on `engine`, or
+    natively if `engine` is "python"."""
+    root = fcc.parse(fcc.lex(data))
+    if engine == "python":
+        return capture(fcc.compile(root, target="python").run)
+    return capture(fcc.run, fcc.compile(root), engine=engine)
+
+
+class EngineTest(unittest.TestCase):
+    def test_output(self):
+        for name in programs:
+            for engine in ["reference", "threaded", "python"]:
+                self.assertEqual(execute(source(name), engine),
+                                 expected(name), "%s on %s" % (name, engine))
+
+    def test_recompile(self):
+        # compiling leaves the tree alone, so it may be compiled again
+        for name in programs:
+            root = fcc.parse(fcc.lex(source(name)))
+            first = fcc.compile(root).to_tuples()
+            program = fcc.compile(root, target="python")
+            self.assertEqual(capture(program.run), expected(name), name)
+            self.assertEqual(fcc.compile(root).to_tuples(), first, name)
+
+    def test_python_depth(self):
+        root = fcc.parse(fcc.lex("int deeper(int n) { return deeper(n + 1); } "
+                                 "void main() { `deeper(0); }"))
+        program = fcc.compile(root, target="python")
+        limit = sys.getrecursionlimit()
+        with self.assertRaises(StackOverflow):
+            program.run(depth=5000)
+        self.assertEqual(sys.getrecursionlimit(), limit)
+
+
+class BytecodeTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_round_trip(self):
+        for name in programs:
+            bytecode = fcc.compile(fcc.parse(fcc.lex(source(name))))
+            path = os.path.join(self.directory, name + ".fbc")
+            fcc.save(bytecode, path)
+            with fcc.load(path) as loaded:
+                self.assertEqual(loaded.to_tuples(), bytecode.to_tuples())
+                self.assertEqual(loaded.symbols, bytecode.symbols)
+                self.assertEqual(loaded.stack, bytecode.stack)
+                for engine in ["reference", "threaded"]:
+                    self.assertEqual(capture(fcc.run, loaded, engine=engine),
+                                     expected(name),
+                                     "%s on %s" % (name, engine))
+
+    def test_constants(self):
+        # operands that do not fit in a word go to the constant pool, which
+        # keeps their type
+        code = [("loadi", 2 ** 40), ("loadf", 1.0), ("loadi", 1),
+                ("loadc", b"a"), ("loadc", "b"), ("loadc", True)]
+        path = os.path.join(self.directory, "constants.fbc")
+        fcc.save(code, path)
+        with fcc.load(path) as loaded:
+            self.assertEqual([[(value, type(value)) for value in operation]
+                              for operation in loaded],
+                             [[(value, type(value)) for value in operation]
+                              for operation in code])
+
+    def test_stack_size(self):
+        # programs that do not recurse get exactly the stack they need
+        for name in programs:
+            bytecode = fcc.compile(fcc.parse(fcc.lex(source(name))))
+            size = fcc.analysis.stack_usage(bytecode).size
+            if size is None:
+                self.assertEqual(bytecode.stack, 65536, name)
+                continue
+            self.assertEqual(bytecode.stack, size, name)
+            for engine in ["reference", "threaded"]:
+                capture(fcc.run, bytecode, size, engine)
+                if size:
+                    with self.assertRaises(StackOverflow):
+                        capture(fcc.run, bytecode, size - 1, engine)
+
+    def test_stack_jumps(self):
+        # an absolute jump that does not lead to a function is not a tail
+        # call; this one closes a loop that pushes on every run
+        code = [("call", 2, 0), ("jmpr", 4), ("loadi", 0), ("loadi", 1),
+                ("jmp", 3), ("ret",)]
+        usage = fcc.analysis.stack_usage(code)
+        self.assertEqual(sorted(usage.frames), [0, 2])
+        self.assertIsNone(usage.size)
+        self.assertEqual(fcc.stack_size(code), 65536)
+        with self.assertRaises(StackOverflow):
+            fcc.run(code)
+
+        usage = fcc.analysis.stack_usage(code, [3])
+        self.assertEqual(sorted(usage.frames), [0, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+# coding=utf-8
+from __future__ import absolute_import, unicode_literals, division
+
+from fcc.tokens.base import Token, TokenType
+
+import unittest
+
+
+class TokenTypeTest(unittest.TestCase):
+    def test_kinds(self):
+        for kind, cls in enumerate(TokenType.classes):
+            self.assertEqual(cls.kind, kind)
+
+    def test_too_many_classes(self):
+        # every kind must fit in a byte, so the 257th class is refused
+        count = len(TokenType.classes)
+        try:
+            with self.assertRaises(AssertionError):
+                for index in xrange(count, 257):
+                    type(str("Extra%d" % index), (Token, ), {})
+            self.assertEqual(len(TokenType.classes), 256)
+        finally:
+            del TokenType.classes[count:]